@@ -14,8 +14,6 @@ import argparse
 import sys
 from pathlib import Path
 
-from hrrr_data import tools
-
 
 def build_arg_parser() -> argparse.ArgumentParser:
     """Create an argument parser for the CLI."""
@@ -42,6 +40,10 @@ def main(argv=None) -> int:
     if not grib_path.exists():
         parser.error(f"GRIB2 file does not exist: {grib_path}")
 
+    # Imported here, so that the command line help and argument errors are shown without the
+    # delay of importing pygrib, netCDF4 and xarray
+    from hrrr_data import tools
+
     out_file = tools.extract_select_sfc_vars_to_netcdf(grib_path)
     print(f"Extracted select surface variables from {grib_path} to {out_file}", flush=True)
     return 0
@@ -5,14 +5,33 @@ surface forecast data from the NOAA AWS S3 archive. It allows users to specify a
 hour, forecast lead hour, and target region to download the corresponding HRRR surface forecast GRIB2 files.
 If requested, it extracts selected surface variables from the GRIB2 files and saves them as netCDF files.
 The script can be executed as a command-line tool or imported as a module for programmatic use.
+In batch mode, the command-line tool reads one date range and configuration per line from standard
+input, and processes them all in one process with one pool of extraction processes.
 """
 
 import argparse
+import multiprocessing
+import os
+import shlex
 import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 
-from hrrr_data import s3, tools
+# Positional command line arguments, which are read from standard input in batch mode
+POSITIONAL_ARGS = (
+    "start_year",
+    "start_month",
+    "start_day",
+    "end_year",
+    "end_month",
+    "end_day",
+    "forecast_init_hour",
+    "forecast_lead_hour",
+    "region",
+    "data_dir",
+)
 
 
 def run_fetch(
@@ -24,8 +43,10 @@ def run_fetch(
     local_dir: Path,
     n_jobs: int = 1,
     extract: bool = False,
+    combine: bool = False,
     refresh: bool = False,
     verbose: bool = False,
+    executor: Executor | None = None,
 ) -> list[Path]:
     """
     Download HRRR surface forecast GRIB2 files for a given date range and configuration, and optionally
@@ -46,9 +67,15 @@ def run_fetch(
     local_dir : Path
         Directory path where downloaded and processed files will be saved.
     n_jobs : int, optional
-        Number of parallel processes to use for downloading files. Default is 1.
+        Number of parallel processes to use for downloading files and, if extract = True, for
+        extracting variables from them. If None, downloads use 1 process and extraction uses
+        one process per CPU. Default is 1.
     extract : bool, optional
         If True, extract select surface variables from each GRIB2 file into a netCDF file. Default is False.
+    combine : bool, optional
+        If True and extract = True, combine the netCDF files into a single netCDF file with a time
+        dimension, named hrrr.<YYYYMMDD>-<YYYYMMDD>.<region>.t<II>z.wrfsfcf<FF>.nc and saved in
+        local_dir. Default is False.
     refresh : bool, optional:
         If True:
           - Download a GRIB file even if it already exists on disk.
@@ -61,16 +88,25 @@ def run_fetch(
         Default is False.
     verbose : bool, optional
         If True, print progress and status messages. Default is False.
+    executor : concurrent.futures.Executor, optional
+        Executor in which the variables are extracted if extract = True, for example a
+        ProcessPoolExecutor shared by several calls. It is not shut down by this function.
+        If None, a pool of n_jobs processes is created for the call. Default is None.
 
     Returns
     -------
     list[Path]
-        A list of paths to the generated netCDF files if extraction is enabled, or an empty list otherwise.
+        A list of paths to the generated netCDF files in date order if extraction is enabled
+        (containing only the combined netCDF file if combine = True), or an empty list otherwise.
     """
 
+    # Imported here, so that the command line help and argument errors are shown without the
+    # delay of importing s3fs, pygrib, netCDF4 and xarray
+    from hrrr_data import s3, tools
+
     data_type = "wrfsfc"  # Surface data
 
-    grib_files = s3.download_date_range(
+    grib_files = s3.download_date_range_iter(
         start_date,
         end_date,
         region,
@@ -85,17 +121,73 @@ def run_fetch(
 
     out_files = []
 
-    if extract:
+    if not extract:
+        # Exhaust the iterator to download all files
+        for _ in grib_files:
+            pass
+
+        return out_files
+
+    # Each GRIB file is converted independently as soon as its download has completed, so that
+    # conversions run in a pool of processes while the remaining files are still downloading.
+    # The netCDF files are returned in date order, the order of the paths of the GRIB files,
+    # whatever the order in which the downloads and the conversions completed.
+
+    if executor is None:
+        executor_context = _extraction_pool(n_jobs)
+    else:
+        executor_context = nullcontext(executor)
+
+    with executor_context as executor:
+        futures = {}
+
         for grib_file in grib_files:
-            out_file = tools.extract_select_sfc_vars_to_netcdf(
-                grib_file, refresh=refresh, verbose=verbose
+            future = executor.submit(
+                tools.extract_select_sfc_vars_to_netcdf, grib_file, refresh, verbose
             )
-            if out_file:
-                out_files.append(out_file)
+            futures[future] = grib_file
+
+        results = {}
+
+        for future in as_completed(futures):
+            grib_file = futures[future]
+            try:
+                results[grib_file] = future.result()
+            except Exception as exc:
+                print(f"Extraction from {grib_file} generated an exception: {exc}", flush=True)
+                continue
+            if verbose:
+                print(f"Extracted select surface variables to {results[grib_file]}", flush=True)
+
+    out_files = [results[grib_file] for grib_file in sorted(results) if results[grib_file]]
+
+    if combine and out_files:
+        combined_file = local_dir / (
+            f"hrrr.{start_date:%Y%m%d}-{end_date:%Y%m%d}.{region}."
+            f"t{init_hour:02d}z.{data_type}f{forecast_lead_hour:02d}.nc"
+        )
+        out_files = [tools.combine_netcdf(out_files, combined_file, verbose=verbose)]
 
     return out_files
 
 
+def _extraction_pool(n_jobs: int | None) -> ProcessPoolExecutor:
+    '''
+    Create a pool of n_jobs extraction processes (one per CPU if n_jobs is None).
+
+    The processes are started with the forkserver method (spawn where it is not available)
+    rather than forked from this process, since they are started while the thread of the S3
+    file system is downloading, and a process forked while other threads hold locks can
+    deadlock.
+    '''
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("forkserver")
+    else:
+        mp_context = multiprocessing.get_context("spawn")
+
+    return ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count(), mp_context=mp_context)
+
+
 def build_arg_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         prog="hrrr-fetch-sfc-forecast",
@@ -103,32 +195,37 @@ def build_arg_parser() -> argparse.ArgumentParser:
             "Download HRRR surface forecast data from the NOAA S3 bucket for a specified date range, "
             "for a specified forecast initialization hour and forecast lead hour, and region; and if requested "
             "extract select surface variables into netCDF files. Both original GRIB2 files and "
-            "processed netCDF files are saved in the given directory."
+            "processed netCDF files are saved in the given directory. With -b, the positional "
+            "arguments are instead read from standard input, one set per line."
         ),
     )
-    parser.add_argument("start_year", type=int, help="Start year of time range.")
-    parser.add_argument("start_month", type=int, help="Start month of time range.")
-    parser.add_argument("start_day", type=int, help="Start day of time range.")
-    parser.add_argument("end_year", type=int, help="End year of time range.")
-    parser.add_argument("end_month", type=int, help="End month of time range.")
-    parser.add_argument("end_day", type=int, help="End day of time range.")
+    parser.add_argument("start_year", nargs="?", type=int, help="Start year of time range.")
+    parser.add_argument("start_month", nargs="?", type=int, help="Start month of time range.")
+    parser.add_argument("start_day", nargs="?", type=int, help="Start day of time range.")
+    parser.add_argument("end_year", nargs="?", type=int, help="End year of time range.")
+    parser.add_argument("end_month", nargs="?", type=int, help="End month of time range.")
+    parser.add_argument("end_day", nargs="?", type=int, help="End day of time range.")
     parser.add_argument(
         "forecast_init_hour",
+        nargs="?",
         type=int,
         help="Forecast initialization hour (see HRRR documentation for availability).",
     )
     parser.add_argument(
         "forecast_lead_hour",
+        nargs="?",
         type=int,
         help="Forecast lead time in hours (see HRRR documentation for availability).",
     )
     parser.add_argument(
         "region",
+        nargs="?",
         type=str,
         help="Region (e.g., conus). See HRRR documentation for valid options.",
     )
     parser.add_argument(
         "data_dir",
+        nargs="?",
         type=str,
         help="Directory into which the data will be downloaded. Created if it does not exist.",
     )
@@ -138,7 +235,7 @@ def build_arg_parser() -> argparse.ArgumentParser:
         dest="n_jobs",
         type=int,
         default=None,
-        help="Number of parallel download processes.",
+        help="Number of parallel download and extraction processes.",
     )
     parser.add_argument(
         "-e",
@@ -146,6 +243,12 @@ def build_arg_parser() -> argparse.ArgumentParser:
         action='store_true',
         help="Extract select variables from downloaded GRIB2 files to netCDF files.",
     )
+    parser.add_argument(
+        "-c",
+        "--combine",
+        action='store_true',
+        help="Combine the extracted netCDF files into a single netCDF file with a time dimension (requires -e).",
+    )
     parser.add_argument(
         '-r',
         '--refresh',
@@ -153,6 +256,16 @@ def build_arg_parser() -> argparse.ArgumentParser:
         help=('Download and process files even if they already exist in the data directory'),
     )
 
+    parser.add_argument(
+        "-b",
+        "--batch",
+        action='store_true',
+        help=(
+            "Read the positional arguments from standard input, one set per line, and process "
+            "all lines in one process, reusing one pool of extraction processes. Options given "
+            "on the command line apply to all lines, and may be overridden on a line."
+        ),
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -170,6 +283,47 @@ def main(argv=None) -> int:
     parser = build_arg_parser()
     args = parser.parse_args(argv)
 
+    if not args.batch:
+        _fetch(parser, args)
+        return 0
+
+    if any(getattr(args, name) is not None for name in POSITIONAL_ARGS):
+        parser.error("positional arguments are read from standard input with -b/--batch")
+
+    # One pool of extraction processes for all lines
+    executor = None
+    if args.extract:
+        executor = _extraction_pool(args.n_jobs)
+
+    with nullcontext() if executor is None else executor:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            # Options on the line override those given on the command line
+            line_args = parser.parse_args(
+                shlex.split(line), namespace=argparse.Namespace(**vars(args))
+            )
+            _fetch(parser, line_args, executor=executor)
+
+    return 0
+
+
+def _fetch(
+    parser: argparse.ArgumentParser, args: argparse.Namespace, executor: Executor | None = None
+) -> list[Path]:
+    '''
+    Run run_fetch with parsed command line arguments.
+    '''
+
+    missing = [name for name in POSITIONAL_ARGS if getattr(args, name) is None]
+    if missing:
+        parser.error(f"missing positional arguments: {', '.join(missing)}")
+
+    if args.combine and not args.extract:
+        parser.error("-c/--combine requires -e/--extract")
+
     start_date = datetime(year=args.start_year, month=args.start_month, day=args.start_day)
     end_date = datetime(year=args.end_year, month=args.end_month, day=args.end_day)
     init_hour = args.forecast_init_hour
@@ -179,6 +333,7 @@ def main(argv=None) -> int:
 
     n_jobs: int | None = args.n_jobs
     extract: bool | None = args.extract
+    combine: bool | None = args.combine
     refresh: bool | None = args.refresh
     verbose: bool | None = args.verbose
 
@@ -191,11 +346,13 @@ def main(argv=None) -> int:
         local_dir,
         n_jobs=n_jobs,
         extract=extract,
+        combine=combine,
         refresh=refresh,
         verbose=verbose,
+        executor=executor,
     )
 
-    return 0
+    return out_files
 
 
 if __name__ == "__main__":
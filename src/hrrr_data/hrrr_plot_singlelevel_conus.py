@@ -9,6 +9,7 @@ This command line interface (CLI):
     Lambert Conformal Conic map over CONUS and saves a PNG next to the input file
     named '<input>.<variable>.png'
   - derives the colorbar label from the variable attributes 'long_name' and 'units'
+  - plots the variables in parallel, one process per variable
 
 Notes:
   - Assumes that the netCDF file contains variables over CONUS.
@@ -18,9 +19,8 @@ import argparse
 import sys
 from pathlib import Path
 
-import xarray as xr
-
-from hrrr_data import plotting
+# Horizontal dimensions
+DIMS = ('ygrid_0', 'xgrid_0')
 
 
 def build_arg_parser() -> argparse.ArgumentParser:
@@ -38,6 +38,14 @@ def build_arg_parser() -> argparse.ArgumentParser:
         type=str,
         help="Path to the netCDF HRRR forecast file.",
     )
+    parser.add_argument(
+        "-n",
+        "--n",
+        dest="n_jobs",
+        type=int,
+        default=None,
+        help="Number of parallel plotting processes. Defaults to one per variable, at most one per CPU.",
+    )
     return parser
 
 
@@ -49,28 +57,30 @@ def main(argv=None) -> int:
     if not ncfile.exists():
         parser.error(f"netCDF file does not exist: {ncfile}")
 
-    # Open the file
-    ds = xr.open_dataset(ncfile)
-
-    # Horizontal dimensions
-    dims = ('ygrid_0', 'xgrid_0')
+    # Imported here, so that the command line help and argument errors are shown without the
+    # delay of importing xarray
+    import xarray as xr
 
     # Select variables whose dimensions are the horizontal dimensions
-    variables = [var for var in ds.data_vars if ds[var].dims == dims]
+    with xr.open_dataset(ncfile) as ds:
+        variables = [var for var in ds.data_vars if ds[var].dims == DIMS]
+
+    if not variables:
+        return 0
 
-    # Plot each of these variables
-    for var in variables:
-        plot_path = ncfile.with_suffix('.' + var + '.png')
+    # Plot each of these variables, in parallel processes, which each open the file
+    from hrrr_data import plotting
 
-        plotting.plot_geographic(
-            ds,
-            var,
-            cbar_label=ds[var].attrs['long_name'] + ' (' + ds[var].attrs['units'] + ')',
-            cmap='coolwarm',
-            plot_path=plot_path,
-        )
+    plot_paths = plotting.plot_geographic_batch(
+        [ncfile] * len(variables),
+        variables,
+        [ncfile.with_suffix(f".{var}.png") for var in variables],
+        n_jobs=args.n_jobs,
+        cmap='coolwarm',
+    )
 
-        print('Created the plot', plot_path, flush=True)
+    for plot_path in plot_paths:
+        print(f"Created the plot {plot_path}", flush=True)
 
     return 0
 
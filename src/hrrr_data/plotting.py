@@ -2,26 +2,74 @@
 Tools for plotting High Resolution Rapid Refresh (HRRR) data.
 '''
 
+from __future__ import annotations
+
+import multiprocessing
+import os
 import warnings
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+# Cartopy, Matplotlib, Shapely and xarray are imported where they are used, so that importing
+# this module (and starting the command line tools that use it) is fast.
+
+if TYPE_CHECKING:
+    import cartopy.crs as ccrs
+    import xarray as xr
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
+    from shapely.geometry.base import BaseGeometry
+
+# Figure width, and margins around the map (inches) that leave room for the title, the grid
+# labels, and the colorbar with its labels. The figure height follows from the aspect ratio
+# of the map, so that the figure can be saved without computing a tight bounding box.
+
+FIG_WIDTH = 11.15
+MARGIN_LEFT = 0.75
+MARGIN_RIGHT = 1.45
+MARGIN_BOTTOM = 0.45
+MARGIN_TOP = 0.35
+
+# Gap between the map and the colorbar, and colorbar width (inches)
+
+CBAR_PAD = 0.17
+CBAR_WIDTH = 0.22
+
+# Default resolution (dots per inch) of saved figures
+
+DPI = 150
 
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-import matplotlib.pyplot as plt
-import xarray as xr
-from cartopy.mpl.ticker import (
-    LatitudeFormatter,
-    LatitudeLocator,
-    LongitudeFormatter,
-    LongitudeLocator,
+# Natural Earth features drawn on the maps (names of cartopy.feature attributes), with their
+# line widths. The scale (resolution) of each feature is chosen from the map extent, as for the
+# corresponding Cartopy features.
+
+NATURAL_EARTH_FEATURES = (
+    ('COASTLINE', 0.5),
+    ('BORDERS', 0.25),
+    ('STATES', 0.25),
 )
-from shapely.geometry.base import BaseGeometry
+
+# zorder of the geometries drawn by plot_geographic, that of Cartopy features. Artists with the
+# same zorder are drawn in the order in which they are added.
+
+GEOMETRIES_ZORDER = 1.5
+
+# Coordinates of HRRR grids in the HRRR projection, computed by _hrrr_grid_xy, for the most
+# recently used grids (full and decimated)
+
+_HRRR_GRID_XY_CACHE: dict[tuple, tuple[np.ndarray, np.ndarray]] = {}
+_HRRR_GRID_XY_CACHE_SIZE = 4
 
 
 def plot_geographic(
-    hrrr_ds: xr.Dataset,
-    hrrr_var: str,
+    hrrr_ds: xr.Dataset = None,
+    hrrr_var: str = None,
     title: str = None,
     cmap=None,
     cbar_label: str = None,
@@ -41,7 +89,18 @@ def plot_geographic(
     geometries_linewidths: list[float] = None,
     geometries_alphas: list[float] = None,
     plot_path: Path = None,
-) -> None:
+    ll_plot_func: str = 'imshow',
+    bbox_inches: str | None = None,
+    decimate: int | str | None = 'auto',
+    rasterize: bool = True,
+    return_fig: bool = False,
+    dpi: int = DPI,
+    draw_grid_labels: bool = True,
+    data_array=None,
+    lat_array=None,
+    lon_array=None,
+    attrs: dict = None,
+) -> Figure | None:
     '''
     Plot the geographic distribution of a High Resolution Rapid Refresh
     HRRR variable over the contiguous United States (CONUS) using a
@@ -63,6 +122,8 @@ def plot_geographic(
                   - 'long_name' and 'units' for labeling
                 • 2D coordinate fields 'gridlat_0' (latitudes) and 'gridlon_0' (longitudes).
 
+            Not used if `data_array` is given.
+
         hrrr_var : str
             Name of the HRRR variable in `hrrr_ds` to plot.
 
@@ -142,8 +203,73 @@ def plot_geographic(
             If provided, the figure will be saved to this path (parent directories
             will be created as needed). No file is saved if `plot_path` is None.
 
+        ll_plot_func : str, optional
+            Matplotlib function used to draw the data:
+
+              - 'imshow' (default): draw the data as an image on the native HRRR
+                Lambert Conformal grid. Much faster than 'pcolormesh', since the grid
+                cells are not transformed individually. Requires a grid that is regular
+                in the HRRR Lambert Conformal projection, such as the HRRR CONUS grid.
+                For other grids (e.g. the HRRR Alaska grid), 'pcolormesh' is used
+                instead.
+              - 'pcolormesh': draw each grid cell as a quadrilateral given by the
+                latitudes and longitudes of the grid points.
+
+        bbox_inches : str, optional
+            Passed to `matplotlib.figure.Figure.savefig`. The figure is laid out to fit
+            the map, its labels and its colorbar, so the default None is usually
+            sufficient. 'tight' crops the figure to its contents, at the cost of drawing
+            the figure twice when it is saved.
+
+        decimate : int, 'auto', or None, optional
+            Plot only every `decimate`-th grid point along each grid dimension. With
+            'auto' (default), the grid is decimated only as far as several grid points
+            would otherwise fall on one pixel of the saved figure, which leaves the
+            full CONUS grid undecimated at the default resolution, and it is not
+            decimated if a map extent (lon_min, lon_max, lat_min, lat_max) is given.
+            None or 1 plots every grid point.
+
+        rasterize : bool, optional
+            If True (default), the plotted data are rasterized when the figure is saved
+            in a vector format (PDF, SVG, EPS), while the colorbar, grid lines, features,
+            and labels remain vector graphics. This keeps vector files small and fast to
+            write. Has no effect on raster formats such as PNG.
+
+        return_fig : bool, optional
+            If True, return the figure, which remains open (for example, for display in
+            a Jupyter notebook). If False (default), close the figure after it has been
+            saved, so that repeated calls do not accumulate open figures.
+
+        dpi : int, optional
+            Resolution (dots per inch) of the saved figure. Defaults to 150, which is
+            sufficient for viewing on screen and about four times faster to encode than
+            300 for PNG output. Use 300 or more for print. For vector formats (PDF, SVG,
+            EPS), it only sets the resolution of the rasterized data (see `rasterize`).
+
+        draw_grid_labels : bool, optional
+            If True (default), label the gridlines with their longitudes and latitudes.
+            False draws the gridlines without labels, which saves the time of placing the
+            labels each time the figure is drawn, and is recommended for animation frames.
+
+        data_array : array-like, optional
+            2D data on the HRRR grid to plot instead of `hrrr_ds[hrrr_var]`, as a NumPy
+            array, a dask array, or an xarray.DataArray. Requires `lat_array` and
+            `lon_array`. This lets the caller select and load the data, for example a
+            tile of a lazily loaded (dask-backed) dataset, without loading the full
+            variable or the coordinates of the full grid. Lazy arrays are computed once,
+            after decimation.
+
+        lat_array, lon_array : array-like, optional
+            2D latitudes and longitudes of the grid points of `data_array`.
+
+        attrs : dict, optional
+            Attributes of `data_array`, as described for `hrrr_var` above, used for the
+            default title and colorbar label. If omitted, the attributes of `data_array`
+            if it is an xarray.DataArray.
+
     Returns:
-        None
+        matplotlib.figure.Figure or None
+            The figure if `return_fig` is True, otherwise None.
 
     Notes:
         all of the following to be provided together:
@@ -158,6 +284,10 @@ def plot_geographic(
 
     '''
 
+    import cartopy.crs as ccrs
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import to_rgba
+
     #
     # Check geometry arguments:
     #
@@ -187,27 +317,48 @@ def plot_geographic(
             stacklevel=2,
         )
 
+    if ll_plot_func not in ('imshow', 'pcolormesh'):
+        raise ValueError(f"ll_plot_func must be 'imshow' or 'pcolormesh', got {ll_plot_func!r}")
+
     #
     # Data and coordinates
     #
 
-    data = hrrr_ds[hrrr_var]
-    lat = hrrr_ds['gridlat_0']
-    lon = hrrr_ds['gridlon_0']
-
-    # Identify initialization time, forecast lead time, and forecast valid time
-
-    forecast_init_time = datetime.strptime(
-        hrrr_ds[hrrr_var].attrs['initial_time'], "%m/%d/%Y (%H:%M)"
-    )
-    forecast_init_time = forecast_init_time.replace(tzinfo=timezone.utc)
-
-    assert hrrr_ds[hrrr_var].attrs['forecast_time_units'] == 'hours', (
-        'Forecast period units must be hours'
-    )
-    forecast_lead_time_hours = int(hrrr_ds[hrrr_var].attrs['forecast_time'])
-
-    forecast_time = forecast_init_time + timedelta(hours=forecast_lead_time_hours)
+    if data_array is not None:
+        if lat_array is None or lon_array is None:
+            raise ValueError('data_array requires lat_array and lon_array')
+        data = data_array
+        lat = lat_array
+        lon = lon_array
+        if attrs is None:
+            attrs = getattr(data_array, 'attrs', {})
+    elif hrrr_ds is not None and hrrr_var is not None:
+        data = hrrr_ds[hrrr_var]
+        lat = hrrr_ds['gridlat_0']
+        lon = hrrr_ds['gridlon_0']
+        attrs = data.attrs
+    else:
+        raise ValueError('Either hrrr_ds and hrrr_var, or data_array must be given')
+
+    # Decimate the grid to the resolution of the saved figure
+
+    extent_given = not (lon_min is None or lon_max is None or lat_min is None or lat_max is None)
+
+    if decimate == 'auto':
+        decimate = _auto_decimate(data.shape[-1], extent_given, dpi)
+
+    if decimate is not None and decimate > 1:
+        data = data[::decimate, ::decimate]
+        lat = lat[::decimate, ::decimate]
+        lon = lon[::decimate, ::decimate]
+
+    # Read (or compute, if the dataset is backed by dask) the data and coordinates once, after
+    # decimation, so that only the plotted grid points are read, and convert the data to
+    # float32 once, rather than in the colormapping when the figure is drawn.
+
+    data = _as_float32(_to_numpy(data))
+    lat = _to_numpy(lat)
+    lon = _to_numpy(lon)
 
     #
     # Plot
@@ -216,98 +367,75 @@ def plot_geographic(
     # Title
 
     if title is None:
-        title = (
-            'HRRR, '
-            + 'initialization = '
-            + forecast_init_time.isoformat()
-            + ', forecast (+'
-            + str(forecast_lead_time_hours)
-            + ' h) = '
-            + forecast_time.isoformat()
-        )
+        title = _default_title(attrs)
 
     # Colorbar title
 
     if cbar_label is None:
-        cbar_label = data.attrs['long_name'] + ' (' + data.attrs['units'] + ')'
+        cbar_label = f"{attrs['long_name']} ({attrs['units']})"
 
     # Use Lambert Conformal Conic projection with HRRR parameters
 
-    hrrr_proj = ccrs.LambertConformal(
-        central_longitude=-97.5, central_latitude=38.5, standard_parallels=(38.5, 38.5)
-    )
+    hrrr_proj = hrrr_projection()
 
     # Create figure
 
-    fig, ax = plt.subplots(figsize=(11.15, 8), subplot_kw={'projection': hrrr_proj})
+    fig, ax = plt.subplots(figsize=(FIG_WIDTH, 8), subplot_kw={'projection': hrrr_proj})
 
     # Create plot area
 
     ax.set_title(title, fontsize=11.15)
 
-    # Plot the data - the meaning of "PlateCarree" here is only that the coordinates are latitude and longitude
+    # An image can be drawn only for a grid that is regular in the HRRR projection
 
-    mesh = ax.pcolormesh(lon, lat, data, transform=ccrs.PlateCarree(), shading='auto', cmap=cmap)
+    if ll_plot_func == 'imshow' and not _hrrr_grid_is_regular(lat, lon, hrrr_proj):
+        ll_plot_func = 'pcolormesh'
 
-    # Plot boundaries
-    if lon_min is not None and lon_max is not None and lat_min is not None and lat_max is not None:
-        ax.set_extent([lon_min, lon_max, lat_min, lat_max], crs=ccrs.PlateCarree())
+    if ll_plot_func == 'imshow':
+        # Plot the data as an image in the HRRR projection, in which the grid is regular
 
-    #
-    # Color bar
-    #
+        image, extent = _hrrr_grid_image(data, lat, lon, hrrr_proj)
 
-    # Get the position of the map axes
+        mesh = ax.imshow(
+            image,
+            extent=extent,
+            origin='lower',
+            transform=hrrr_proj,
+            interpolation='nearest',
+            cmap=cmap,
+            rasterized=rasterize,
+        )
+    else:
+        # Plot the data on the grid coordinates in the HRRR projection, which are projected
+        # once per grid, so that Cartopy does not reproject the grid on each plot
+
+        x, y = _hrrr_grid_xy(lat, lon, hrrr_proj)
+
+        mesh = ax.pcolormesh(
+            x,
+            y,
+            data,
+            transform=hrrr_proj,
+            shading='auto',
+            cmap=cmap,
+            rasterized=rasterize,
+        )
 
-    pos = ax.get_position()
+    # Plot boundaries
+    if extent_given:
+        ax.set_extent([lon_min, lon_max, lat_min, lat_max], crs=ccrs.PlateCarree())
 
-    # Create a new axes for the colorbar next to the map, matching its vertical extent
+    # Size the figure and place the map axes and the colorbar axes
 
-    cbar_ax = fig.add_axes([pos.x1 + 0.015, pos.y0, 0.02, pos.height])
+    cbar_ax = _layout_map(fig, ax)
 
     # Create colorbar
 
-    cbar = fig.colorbar(mesh, cax=cbar_ax)
-    cbar.set_label(cbar_label, fontsize=12)
-    cbar.ax.tick_params(labelsize=12)
+    _add_colorbar(fig, mesh, cbar_ax, cbar_label)
 
-    #
-    # Add coastlines or other geographic features
-    #
+    # Add coastlines, borders and states, and gridlines
 
-    ax.coastlines(linewidth=0.5)
-    ax.add_feature(cfeature.BORDERS, linewidth=0.25)
-    ax.add_feature(cfeature.STATES, linewidth=0.25)
-
-    #
-    # Gridlines
-    #
-
-    gl = ax.gridlines(draw_labels=True, linewidth=0.5, color='black', alpha=1.0, linestyle='--')
-
-    # Grid labels on the axes (not inline on the map)
-
-    gl.x_inline = False
-    gl.y_inline = False
-    gl.bottom_labels = True
-    gl.left_labels = True
-    gl.top_labels = False
-    gl.right_labels = False
-
-    # Choose where lines go
-
-    gl.xlocator = LongitudeLocator(nbins=6)
-    gl.ylocator = LatitudeLocator(nbins=6)
-
-    # Nice degree formatting
-
-    gl.xformatter = LongitudeFormatter(number_format='.0f', degree_symbol='°')
-    gl.yformatter = LatitudeFormatter(number_format='.0f', degree_symbol='°')
-
-    # Force horizontal labels
-
-    gl.xlabel_style = {'rotation': 0, 'ha': 'center', 'va': 'top', 'size': 12}
-    gl.ylabel_style = {'rotation': 0, 'ha': 'right', 'va': 'center', 'size': 12}
+    _add_map_features(ax, dpi, draw_grid_labels)
 
     #
     # Add location markers
@@ -322,6 +450,14 @@ def plot_geographic(
         and location_colors is not None
         and location_sizes is not None
     ):
+        # The locations of all groups are drawn with a single scatter plot, with colors and
+        # marker sizes given per location
+
+        scatter_lons = []
+        scatter_lats = []
+        scatter_colors = []
+        scatter_sizes = []
+
         for location_legend, lons, lats, location_color, location_size in zip(
             location_legends,
             location_lons,
@@ -330,15 +466,12 @@ def plot_geographic(
             location_sizes,
             strict=False,
         ):
-            for lon, lat in zip(lons, lats, strict=False):
-                ax.plot(
-                    lon,
-                    lat,
-                    marker='o',
-                    color=location_color,
-                    markersize=location_size,
-                    transform=ccrs.PlateCarree(),
-                )
+            n_locations = min(len(lons), len(lats))
+
+            scatter_lons.append(np.asarray(lons, dtype=float)[:n_locations])
+            scatter_lats.append(np.asarray(lats, dtype=float)[:n_locations])
+            scatter_colors.extend([to_rgba(location_color)] * n_locations)
+            scatter_sizes.extend([location_size**2] * n_locations)  # Marker area in points^2
 
             # Legend handle
 
@@ -354,13 +487,39 @@ def plot_geographic(
 
             legend_handles.append(legend_handle)
 
+        if scatter_colors:
+            # Project all locations into the HRRR projection with one transform, and draw
+            # them in it, so that Cartopy does not transform them again
+
+            xy = hrrr_proj.transform_points(
+                ccrs.PlateCarree(), np.concatenate(scatter_lons), np.concatenate(scatter_lats)
+            )
+
+            ax.scatter(
+                xy[:, 0],
+                xy[:, 1],
+                s=scatter_sizes,
+                c=scatter_colors,
+                marker='o',
+                zorder=2,
+                transform=hrrr_proj,
+            )
+
     #
     # Draw regions based on the provided geometries using the Cartopy method 'add_geometries'
     #
 
     if plot_geometries:
-        for name, facecolor, edgecolor, linewidth, alpha, geometry in zip(
-            geometries_names,
+        # Consecutive geometries with the same style are drawn with a single call. Only
+        # consecutive ones are grouped, so that the geometries are drawn in the given order,
+        # each above the preceding ones, as when drawn one by one. Styles are compared with
+        # colors converted to RGBA. All are drawn at the zorder of Cartopy features
+        # (GEOMETRIES_ZORDER), above the map features drawn before and below the locations.
+
+        style_groups = []
+        last_style_key = None
+
+        for facecolor, edgecolor, linewidth, alpha, geometry in zip(
             geometries_facecolors,
             geometries_edgecolors,
             geometries_linewidths,
@@ -368,16 +527,29 @@ def plot_geographic(
             geometries,
             strict=False,
         ):
+            style_key = (_color_key(facecolor), _color_key(edgecolor), linewidth, alpha)
+            if style_key != last_style_key:
+                style = {
+                    'facecolor': facecolor,
+                    'edgecolor': edgecolor,
+                    'linewidth': linewidth,
+                    'alpha': alpha,
+                }
+                style_groups.append((style, []))
+                last_style_key = style_key
+            style_groups[-1][1].append(geometry)
+
+        for style, group_geometries in style_groups:
             ax.add_geometries(
-                [geometry],  # accepts an iterable of shapely geometries
+                group_geometries,  # accepts an iterable of shapely geometries
                 crs=ccrs.PlateCarree(),  # source coordinate reference system
-                facecolor=facecolor,
-                edgecolor=edgecolor,
-                linewidth=linewidth,
-                alpha=alpha,
-                label=name,
+                zorder=GEOMETRIES_ZORDER,
+                **style,
             )
 
+        for name, facecolor, edgecolor in zip(
+            geometries_names, geometries_facecolors, geometries_edgecolors, strict=False
+        ):
             # Legend handle
 
             if edgecolor is not None:
@@ -409,6 +581,647 @@ def plot_geographic(
 
     if plot_path is not None:
         plot_path.parent.mkdir(parents=True, exist_ok=True)
-        fig.savefig(plot_path, bbox_inches="tight", dpi=300)
+        fig.savefig(plot_path, bbox_inches=bbox_inches, dpi=dpi)
+
+    if return_fig:
+        return fig
+
+    plt.close(fig)
+
+    return None
+
+
+def plot_geographic_batch(
+    datasets: Sequence[xr.Dataset | Path],
+    hrrr_vars: str | Sequence[str],
+    plot_paths: Sequence[Path],
+    n_jobs: int | None = None,
+    **kwargs,
+) -> list[Path]:
+    '''
+    Create and save several plots with plot_geographic in parallel processes.
+
+    Each plot is created in a worker process using the non-interactive Agg backend, since
+    Matplotlib's pyplot interface is not thread-safe. Each worker process reads the Natural
+    Earth geometries once, and reuses them for all the plots it creates.
+
+    The worker processes are started with the forkserver method (spawn where it is not
+    available) rather than forked from the calling process, which may already run other
+    threads (e.g. those of s3fs or Matplotlib), since a process forked while other threads
+    hold locks can deadlock. Scripts calling this function must therefore guard their entry
+    point with ``if __name__ == '__main__':``.
+
+    Args:
+        datasets : sequence type[xarray.Dataset or pathlib.Path]
+            One HRRR dataset per plot (see plot_geographic), or the path of a netCDF
+            file containing it. Paths are opened in the worker processes, which avoids
+            sending the data to them, so they are preferable to datasets.
+
+        hrrr_vars : str or sequence type[str]
+            Name of the HRRR variable to plot, either one name for all plots or one name
+            per plot.
+
+        plot_paths : sequence type[pathlib.Path]
+            One path per plot, to which the plot is saved.
+
+        n_jobs : int, optional
+            Number of worker processes. If None (default), one per plot, at most one
+            per CPU.
+
+        **kwargs :
+            Further keyword arguments passed to plot_geographic for all plots.
+
+    Returns:
+        list[pathlib.Path]
+            The paths of the saved plots, in the order of `plot_paths`.
+    '''
+
+    if isinstance(hrrr_vars, str):
+        hrrr_vars = [hrrr_vars] * len(datasets)
+
+    if not len(datasets) == len(hrrr_vars) == len(plot_paths):
+        raise ValueError(
+            f'datasets, hrrr_vars and plot_paths must have the same length, got '
+            f'{len(datasets)}, {len(hrrr_vars)} and {len(plot_paths)}'
+        )
+
+    if not plot_paths:
+        return []
+
+    n_jobs = n_jobs or min(len(plot_paths), os.cpu_count() or 1)
+
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context('forkserver')
+    else:
+        mp_context = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, mp_context=mp_context, initializer=_use_agg_backend
+    ) as executor:
+        futures = [
+            executor.submit(_plot_geographic_worker, dataset, hrrr_var, plot_path, kwargs)
+            for dataset, hrrr_var, plot_path in zip(datasets, hrrr_vars, plot_paths, strict=True)
+        ]
+
+        return [future.result() for future in futures]
+
+
+class HRRRMapTemplate:
+    '''
+    Map of the HRRR grid that is reused to plot several variables or times on the same grid,
+    for example one plot per forecast lead time.
+
+    The figure, the map projection and extent, the coastlines, borders, states and gridlines
+    are created once. Each call of render draws only the data, the colorbar and the title,
+    and removes those of the previous call, which saves most of the time of a plot compared
+    to plot_geographic. The data are drawn as an image on the native HRRR grid (see the
+    'imshow' option of plot_geographic), so the grid must be regular in the HRRR projection,
+    as the HRRR CONUS grid is; a ValueError is raised otherwise.
+
+    Args:
+        hrrr_ds : xarray.Dataset
+            HRRR dataset containing the 2D coordinate fields 'gridlat_0' (latitudes) and
+            'gridlon_0' (longitudes) of the grid of the data to be plotted.
+
+        lon_min, lon_max, lat_min, lat_max : float, optional
+            Map extent (degrees), as in plot_geographic. Used only if all four are provided.
+            If omitted, the map shows the entire grid.
+
+        decimate : int, 'auto', or None, optional
+            Plot only every `decimate`-th grid point along each grid dimension, as in
+            plot_geographic. Default is 'auto'.
+
+        rasterize : bool, optional
+            Rasterize the plotted data in vector formats, as in plot_geographic. Default
+            is True.
+
+        dpi : int, optional
+            Resolution (dots per inch) of the saved figures. Default is 150.
+
+        draw_grid_labels : bool, optional
+            Label the gridlines, as in plot_geographic. Default is True.
+
+    Example:
+        template = HRRRMapTemplate(ds)
+        for hrrr_var in hrrr_vars:
+            template.render(ds[hrrr_var], Path(f'{hrrr_var}.png'))
+        template.close()
+    '''
+
+    def __init__(
+        self,
+        hrrr_ds: xr.Dataset,
+        lon_min: float = None,
+        lon_max: float = None,
+        lat_min: float = None,
+        lat_max: float = None,
+        decimate: int | str | None = 'auto',
+        rasterize: bool = True,
+        dpi: int = DPI,
+        draw_grid_labels: bool = True,
+    ):
+        import cartopy.crs as ccrs
+        import matplotlib.pyplot as plt
+
+        lat = hrrr_ds['gridlat_0']
+        lon = hrrr_ds['gridlon_0']
+
+        extent_given = not (
+            lon_min is None or lon_max is None or lat_min is None or lat_max is None
+        )
+
+        if decimate == 'auto':
+            decimate = _auto_decimate(lat.shape[-1], extent_given, dpi)
+
+        self.decimate = decimate if decimate is not None and decimate > 1 else 1
+        self.rasterize = rasterize
+        self.dpi = dpi
+
+        self._lat = np.asarray(lat.values[:: self.decimate, :: self.decimate])
+        self._lon = np.asarray(lon.values[:: self.decimate, :: self.decimate])
+
+        self._hrrr_proj = hrrr_projection()
+
+        if not _hrrr_grid_is_regular(self._lat, self._lon, self._hrrr_proj):
+            raise ValueError(
+                'HRRRMapTemplate requires a grid that is regular in the HRRR projection; '
+                "use plot_geographic with ll_plot_func='pcolormesh' for this grid"
+            )
+
+        self.fig, self.ax = plt.subplots(
+            figsize=(FIG_WIDTH, 8), subplot_kw={'projection': self._hrrr_proj}
+        )
+
+        # The extent and the orientation of the grid image depend only on the coordinates
+
+        self._image_extent, self._flip_x, self._flip_y = _hrrr_grid_extent(
+            self._lat, self._lon, self._hrrr_proj
+        )
+
+        # The map extent is set before any data are drawn, and is not changed by them
+
+        if extent_given:
+            self.ax.set_extent([lon_min, lon_max, lat_min, lat_max], crs=ccrs.PlateCarree())
+        else:
+            self.ax.set_extent(list(self._image_extent), crs=self._hrrr_proj)
+
+        self._cbar_ax = _layout_map(self.fig, self.ax)
+
+        _add_map_features(self.ax, dpi, draw_grid_labels)
+
+        self._image = None
+
+    def render(
+        self,
+        data: xr.DataArray,
+        plot_path: Path = None,
+        title: str = None,
+        cmap=None,
+        cbar_label: str = None,
+        bbox_inches: str | None = None,
+    ) -> Figure:
+        '''
+        Plot one HRRR variable on the map, replacing the previously plotted one, and save the
+        figure.
+
+        Args:
+            data : xarray.DataArray
+                HRRR variable on the grid of the template, with the attributes described
+                for `hrrr_var` in plot_geographic.
+
+            plot_path : pathlib.Path, optional
+                If provided, the figure will be saved to this path (parent directories
+                will be created as needed).
+
+            title, cmap, cbar_label, bbox_inches : optional
+                As in plot_geographic.
+
+        Returns:
+            matplotlib.figure.Figure
+                The figure of the template, which remains open for further calls.
+        '''
+
+        attrs = data.attrs
+        # Decimate before reading the data, so that only the plotted grid points are read
+
+        values = _as_float32(_to_numpy(data[:: self.decimate, :: self.decimate]))
+
+        if title is None:
+            title = _default_title(attrs)
+
+        if cbar_label is None:
+            cbar_label = f"{attrs['long_name']} ({attrs['units']})"
+
+        # Remove the data and the colorbar of the previous call, keeping the colorbar axes
+
+        if self._image is not None:
+            self._image.remove()
+            self._cbar_ax.clear()
+
+        self._image = self.ax.imshow(
+            _flip_grid_image(values, self._flip_x, self._flip_y),
+            extent=self._image_extent,
+            origin='lower',
+            transform=self._hrrr_proj,
+            interpolation='nearest',
+            cmap=cmap,
+            rasterized=self.rasterize,
+        )
+
+        self.ax.set_title(title, fontsize=11.15)
+
+        _add_colorbar(self.fig, self._image, self._cbar_ax, cbar_label)
+
+        if plot_path is not None:
+            plot_path.parent.mkdir(parents=True, exist_ok=True)
+            self.fig.savefig(plot_path, bbox_inches=bbox_inches, dpi=self.dpi)
+
+        return self.fig
+
+    def close(self) -> None:
+        '''Close the figure of the template.'''
+        import matplotlib.pyplot as plt
+
+        plt.close(self.fig)
+
+
+def _use_agg_backend() -> None:
+    '''Select the non-interactive Agg backend in a worker process.'''
+    import matplotlib
+
+    matplotlib.use('Agg')
+
+
+def _plot_geographic_worker(
+    dataset: xr.Dataset | Path, hrrr_var: str, plot_path: Path, kwargs: dict
+) -> Path:
+    '''Create and save one plot in a worker process of plot_geographic_batch.'''
+    import xarray as xr
+
+    if isinstance(dataset, xr.Dataset):
+        plot_geographic(dataset, hrrr_var, plot_path=plot_path, **kwargs)
+    else:
+        with xr.open_dataset(dataset) as ds:
+            plot_geographic(ds, hrrr_var, plot_path=plot_path, **kwargs)
+
+    return plot_path
+
+
+@lru_cache(maxsize=1)
+def hrrr_projection() -> ccrs.LambertConformal:
+    '''
+    Return the Lambert Conformal Conic projection of the HRRR grid.
+
+    The projection uses the spherical Earth of the HRRR grid (radius 6371229 m), on which the
+    grid is regular. The same instance is returned on each call, so that plots share the
+    projection and Cartopy's caches of geometries projected into it.
+    '''
+    import cartopy.crs as ccrs
+
+    return ccrs.LambertConformal(
+        central_longitude=-97.5,
+        central_latitude=38.5,
+        standard_parallels=(38.5, 38.5),
+        globe=ccrs.Globe(ellipse='sphere', semimajor_axis=6371229, semiminor_axis=6371229),
+    )
+
+
+def _auto_decimate(nx: int, extent_given: bool, dpi: int) -> int:
+    '''
+    Return the decimation of a grid with nx points along x at which the grid points fall on
+    about one pixel of the saved map each, or 1 if a map extent is given.
+    '''
+    map_width_pixels = (FIG_WIDTH - MARGIN_LEFT - MARGIN_RIGHT) * dpi
+    return 1 if extent_given else max(1, int(nx / map_width_pixels))
+
+
+def _default_title(attrs: dict) -> str:
+    '''Return a plot title with the initialization and valid time from HRRR variable attributes.'''
+
+    # Identify initialization time, forecast lead time, and forecast valid time
+
+    forecast_init_time = _parse_init_time(attrs['initial_time'])
+
+    assert attrs['forecast_time_units'] == 'hours', 'Forecast period units must be hours'
+    forecast_lead_time_hours = int(attrs['forecast_time'])
+
+    forecast_time = forecast_init_time + timedelta(hours=forecast_lead_time_hours)
+
+    return (
+        f'HRRR, initialization = {forecast_init_time.isoformat()}, '
+        f'forecast (+{forecast_lead_time_hours} h) = {forecast_time.isoformat()}'
+    )
+
+
+@lru_cache(maxsize=256)
+def _parse_init_time(initial_time: str) -> datetime:
+    '''
+    Return the initialization time (UTC) given by the 'initial_time' attribute of a HRRR
+    variable, as '%m/%d/%Y (%H:%M)'. Parsed once per value, since the variables of a forecast
+    and the forecasts of a run share it.
+    '''
+    return datetime.strptime(initial_time, "%m/%d/%Y (%H:%M)").replace(tzinfo=timezone.utc)
+
+
+def _layout_map(fig: Figure, ax) -> Axes:
+    '''
+    Size the figure and place the map axes so that the map fills the figure, except for the
+    margins, and return a new axes for the colorbar next to the map.
+    '''
+
+    x0, x1, y0, y1 = ax.get_extent()
+    map_width = FIG_WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    map_height = map_width * (y1 - y0) / (x1 - x0)
+    fig_height = map_height + MARGIN_BOTTOM + MARGIN_TOP
+
+    fig.set_size_inches(FIG_WIDTH, fig_height)
+    ax.set_position(
+        [
+            MARGIN_LEFT / FIG_WIDTH,
+            MARGIN_BOTTOM / fig_height,
+            map_width / FIG_WIDTH,
+            map_height / fig_height,
+        ]
+    )
+
+    # The colorbar axes matches the vertical extent of the map. Its position follows from the
+    # layout above, without querying the map axes.
+
+    return fig.add_axes(
+        [
+            (MARGIN_LEFT + map_width + CBAR_PAD) / FIG_WIDTH,
+            MARGIN_BOTTOM / fig_height,
+            CBAR_WIDTH / FIG_WIDTH,
+            map_height / fig_height,
+        ]
+    )
+
+
+def _add_colorbar(fig: Figure, mesh, cbar_ax, cbar_label: str) -> None:
+    '''Draw the colorbar of the plotted data in the colorbar axes.'''
+    cbar = fig.colorbar(mesh, cax=cbar_ax)
+    cbar.set_label(cbar_label, fontsize=12)
+    cbar.ax.tick_params(labelsize=12)
+
+
+def _add_map_features(ax, dpi: int, draw_grid_labels: bool = True) -> None:
+    '''Draw the coastlines, borders, states and gridlines, labeled if requested, on the map.'''
+
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+    from cartopy.mpl.ticker import (
+        LatitudeFormatter,
+        LatitudeLocator,
+        LongitudeFormatter,
+        LongitudeLocator,
+    )
+
+    # The geometries of the features are read once per process, and only those intersecting
+    # the map extent are drawn, simplified to about the size of a pixel of the saved figure.
+    # Both are reused by all plots with the same extent.
+
+    map_extent = tuple(ax.get_extent(crs=ccrs.PlateCarree()))
+    map_width = FIG_WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    tolerance = (map_extent[1] - map_extent[0]) / (map_width * dpi)
+
+    for feature_name, linewidth in NATURAL_EARTH_FEATURES:
+        feature = getattr(cfeature, feature_name)
+        ax.add_geometries(
+            _natural_earth_geometries_in_extent(
+                feature.category,
+                feature.name,
+                feature.scaler.scale_from_extent(map_extent),
+                map_extent,
+                tolerance,
+            ),
+            crs=ccrs.PlateCarree(),
+            facecolor='none',
+            edgecolor='black',
+            linewidth=linewidth,
+        )
+
+    #
+    # Gridlines
+    #
+
+    gl = ax.gridlines(
+        draw_labels=draw_grid_labels, linewidth=0.5, color='black', alpha=1.0, linestyle='--'
+    )
+
+    # Choose where lines go
+
+    gl.xlocator = LongitudeLocator(nbins=6)
+    gl.ylocator = LatitudeLocator(nbins=6)
+
+    if not draw_grid_labels:
+        return
+
+    # Grid labels on the axes (not inline on the map)
+
+    gl.x_inline = False
+    gl.y_inline = False
+    gl.bottom_labels = True
+    gl.left_labels = True
+    gl.top_labels = False
+    gl.right_labels = False
+
+    # Nice degree formatting
+
+    gl.xformatter = LongitudeFormatter(number_format='.0f', degree_symbol='°')
+    gl.yformatter = LatitudeFormatter(number_format='.0f', degree_symbol='°')
+
+    # Force horizontal labels
+
+    gl.xlabel_style = {'rotation': 0, 'ha': 'center', 'va': 'top', 'size': 12}
+    gl.ylabel_style = {'rotation': 0, 'ha': 'right', 'va': 'center', 'size': 12}
+
+
+@lru_cache(maxsize=32)
+def _natural_earth_geometries(category: str, name: str, scale: str) -> tuple[BaseGeometry, ...]:
+    '''
+    Return the geometries of a Natural Earth feature, read from its shapefile once per process.
+    '''
+    import cartopy.feature as cfeature
+
+    return tuple(cfeature.NaturalEarthFeature(category, name, scale).geometries())
+
+
+@lru_cache(maxsize=32)
+def _natural_earth_geometries_in_extent(
+    category: str,
+    name: str,
+    scale: str,
+    extent: tuple[float, float, float, float],
+    tolerance: float = 0.0,
+) -> tuple[BaseGeometry, ...]:
+    '''
+    Return the geometries of a Natural Earth feature that intersect an extent
+    (lon_min, lon_max, lat_min, lat_max), simplified with the given tolerance (degrees).
+    '''
+    import shapely.geometry
+
+    lon_min, lon_max, lat_min, lat_max = extent
+    bbox = shapely.geometry.box(lon_min, lat_min, lon_max, lat_max)
+
+    geometries = (
+        geometry
+        for geometry in _natural_earth_geometries(category, name, scale)
+        if geometry.intersects(bbox)
+    )
+
+    if tolerance > 0:
+        geometries = (
+            geometry.simplify(tolerance, preserve_topology=True) for geometry in geometries
+        )
+
+    return tuple(geometry for geometry in geometries if not geometry.is_empty)
+
+
+def _color_key(color) -> tuple[float, float, float, float] | None:
+    '''Return a color as a hashable RGBA tuple, for comparing colors given in any format.'''
+    from matplotlib.colors import to_rgba
+
+    return None if color is None else to_rgba(color)
+
+
+def _to_numpy(array) -> np.ndarray:
+    '''
+    Return a NumPy array, an xarray.DataArray, or a dask array as a NumPy array, reading or
+    computing it if needed. Masked arrays are returned as masked arrays.
+    '''
+    if hasattr(array, 'compute'):
+        array = array.compute()
+    return np.asanyarray(getattr(array, 'values', array))
+
+
+def _as_float32(values) -> np.ndarray:
+    '''
+    Return data as a contiguous float32 array for plotting, preserving masks of masked arrays.
+    '''
+    if np.ma.isMaskedArray(values):
+        return np.ma.asarray(values, dtype=np.float32)
+    return np.ascontiguousarray(values, dtype=np.float32)
+
+
+def _hrrr_grid_xy(
+    lat: np.ndarray, lon: np.ndarray, hrrr_proj: ccrs.Projection
+) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Return the coordinates (x, y) of the HRRR grid points in the HRRR projection.
+
+    The coordinates are computed once per process for each grid, identified by its shape and
+    the latitudes and longitudes of its first and last grid point.
+    '''
+    import cartopy.crs as ccrs
+
+    key = (lat.shape, lat[0, 0], lon[0, 0], lat[-1, -1], lon[-1, -1])
+
+    xy = _HRRR_GRID_XY_CACHE.get(key)
+    if xy is None:
+        points = hrrr_proj.transform_points(ccrs.PlateCarree(), lon, lat)
+        xy = (points[..., 0], points[..., 1])
+
+        if len(_HRRR_GRID_XY_CACHE) >= _HRRR_GRID_XY_CACHE_SIZE:
+            _HRRR_GRID_XY_CACHE.pop(next(iter(_HRRR_GRID_XY_CACHE)))
+        _HRRR_GRID_XY_CACHE[key] = xy
+
+    return xy
+
+
+def _hrrr_grid_is_regular(lat: np.ndarray, lon: np.ndarray, hrrr_proj: ccrs.Projection) -> bool:
+    '''
+    Return True if the grid is regular in the HRRR projection, so that it can be drawn as an
+    image.
+
+    The corners and the center of the grid are projected. The grid is taken to be regular if
+    the projected x coordinate depends only on the column index and the y coordinate only on
+    the row index, with constant spacing, within 1% of the grid spacing.
+    '''
+    import cartopy.crs as ccrs
+
+    ny, nx = lat.shape
+    if ny < 2 or nx < 2:
+        return False
+
+    rows = np.array([0, 0, ny - 1, ny - 1, ny // 2])
+    cols = np.array([0, nx - 1, 0, nx - 1, nx // 2])
+
+    points = hrrr_proj.transform_points(
+        ccrs.PlateCarree(),
+        np.asarray(lon[rows, cols], dtype=np.float64),
+        np.asarray(lat[rows, cols], dtype=np.float64),
+    )
+    x, y = points[:, 0], points[:, 1]
+
+    if not np.all(np.isfinite(x)) or not np.all(np.isfinite(y)):
+        return False
+
+    dx = (x[1] - x[0]) / (nx - 1)
+    dy = (y[2] - y[0]) / (ny - 1)
+    if dx == 0 or dy == 0:
+        return False
+
+    x_expected = x[0] + cols * dx
+    y_expected = y[0] + rows * dy
+
+    return bool(
+        np.all(np.abs(x - x_expected) <= 0.01 * abs(dx))
+        and np.all(np.abs(y - y_expected) <= 0.01 * abs(dy))
+    )
+
+
+def _hrrr_grid_extent(
+    lat: np.ndarray, lon: np.ndarray, hrrr_proj: ccrs.Projection
+) -> tuple[tuple[float, float, float, float], bool, bool]:
+    '''
+    Return the extent (left, right, bottom, top) in the HRRR projection of the image of data
+    on a grid that is regular in the HRRR projection, and whether the data must be flipped
+    along the x and the y axis to be drawn with origin='lower'.
+
+    The extent follows from the projected coordinates of the first and the last grid point.
+    The data must be flipped along the axes on which the projected coordinates decrease.
+    '''
+    import cartopy.crs as ccrs
+
+    ny, nx = lat.shape
+
+    corners = hrrr_proj.transform_points(
+        ccrs.PlateCarree(), np.array([lon[0, 0], lon[-1, -1]]), np.array([lat[0, 0], lat[-1, -1]])
+    )
+    (x0, x1), (y0, y1) = corners[:, 0], corners[:, 1]
+
+    flip_x = bool(x1 < x0)
+    if flip_x:
+        x0, x1 = x1, x0
+
+    flip_y = bool(y1 < y0)
+    if flip_y:
+        y0, y1 = y1, y0
+
+    dx = (x1 - x0) / (nx - 1)
+    dy = (y1 - y0) / (ny - 1)
+
+    return (x0 - dx / 2, x1 + dx / 2, y0 - dy / 2, y1 + dy / 2), flip_x, flip_y
+
+
+def _flip_grid_image(data: np.ndarray, flip_x: bool, flip_y: bool) -> np.ndarray:
+    '''
+    Return data flipped along the x (last) and the y (first) axis as requested.
+    '''
+    if flip_x:
+        data = data[:, ::-1]
+    if flip_y:
+        data = data[::-1, :]
+    return data
+
+
+def _hrrr_grid_image(
+    data: np.ndarray, lat: np.ndarray, lon: np.ndarray, hrrr_proj: ccrs.Projection
+) -> tuple[np.ndarray, tuple[float, float, float, float]]:
+    '''
+    Return data on the HRRR grid as an image to be drawn with origin='lower', and the extent
+    (left, right, bottom, top) of the image in the HRRR projection (see _hrrr_grid_extent).
+    '''
+    extent, flip_x, flip_y = _hrrr_grid_extent(lat, lon, hrrr_proj)
 
-    return
+    return _flip_grid_image(data, flip_x, flip_y), extent
@@ -10,16 +10,71 @@ The key is a unique string that identifies the object (like a file path).
 In this module, we refer to the "keys" as "paths", and they are relative to the NOAA HRRR bucket.
 """
 
+import asyncio
+import contextlib
+import fnmatch
 import hashlib
+import json
+import os
+import re
+import threading
+import time
 import warnings
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections.abc import Iterator
+from concurrent.futures import as_completed
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 
 import s3fs
+from fsspec.asyn import sync
 
 BUCKET = 'noaa-hrrr-bdp-pds'
 
+# Objects at least this large (bytes) are downloaded with concurrent byte-range requests
+MULTIPART_THRESHOLD = 8 * 1024**2
+
+# Size (bytes) of the byte ranges of a multipart download
+MULTIPART_CHUNKSIZE = 16 * 1024**2
+
+# Maximum number of concurrent byte-range requests per multipart download
+MAX_CONCURRENCY = 10
+
+# Maximum number of pooled HTTP connections of the shared S3 client. Parallel downloads
+# (n_jobs files with up to MAX_CONCURRENCY byte-range requests each) would otherwise wait
+# for a connection from the botocore default pool of 10.
+MAX_POOL_CONNECTIONS = max(64, (os.cpu_count() or 4) * 5)
+
+# Retry configuration of the shared S3 client
+RETRIES = {'mode': 'adaptive', 'max_attempts': 10}
+
+# Block size (bytes) of files opened for reading with the shared S3 file system, for example
+# when reading parts of a GRIB file directly from S3. The s3fs default of 5 MiB issues many
+# sequential requests for HRRR files, which are hundreds of MB large.
+DEFAULT_BLOCK_SIZE = 64 * 1024**2
+
+# Lock of the file positions of multipart downloads where os.pwrite is not available
+_write_lock = threading.Lock()
+
+# Time (seconds) for which the results of ls and ls_re are reused for the same path
+LISTING_CACHE_TTL = 300
+
+# Results of ls and ls_re by function and path, with the time at which they were listed
+_listing_cache: dict[tuple[str, str], tuple[float, tuple[str, ...]]] = {}
+
+# Time (s) for which the properties of an object returned by info are reused. HRRR objects do not
+# change once published.
+INFO_CACHE_TTL = 24 * 3600
+
+# Time (s) for which it is remembered that an object does not exist, since it may be published soon
+INFO_MISS_CACHE_TTL = 60
+
+# Results of info by S3 key, with the time at which they were retrieved (None if no object)
+_info_cache: dict[str, tuple[float, dict | None]] = {}
+
+# Characters that make a path segment a wildcard pattern
+_GLOB_MAGIC = re.compile(r'[*?\[]')
+
 
 def ls(path: str) -> list[str]:
     """
@@ -34,20 +89,27 @@ def ls(path: str) -> list[str]:
 
     Returns:
         list: List of path contents.
+
+    Notes:
+        The result is reused for LISTING_CACHE_TTL seconds (see `invalidate_listing_cache`).
     """
 
+    cached = _get_cached_listing('ls', path)
+    if cached is not None:
+        return cached
+
     # Access S3
-    fs = s3fs.S3FileSystem(anon=True)
+    fs = _get_fs()
 
     # List files
     files = fs.ls(BUCKET + '/' + path)
 
-    # Cut the bucket part from the path
-    prefix = BUCKET + '/'
+    # Cut the bucket part from the path (all listed paths are in the bucket)
+    n = len(BUCKET) + 1
 
-    paths = [file[len(prefix) :] for file in files if file.startswith(prefix)]
+    paths = [file[n:] for file in files]
 
-    return paths
+    return _cache_listing('ls', path, paths)
 
 
 def ls_re(path: str) -> list[str]:
@@ -64,83 +126,314 @@ def ls_re(path: str) -> list[str]:
 
     Returns:
         list: List of path contents.
+
+    Notes:
+        The result is reused for LISTING_CACHE_TTL seconds (see `invalidate_listing_cache`).
     """
 
+    cached = _get_cached_listing('ls_re', path)
+    if cached is not None:
+        return cached
+
     # Access S3
-    fs = s3fs.S3FileSystem(anon=True)
+    fs = _get_fs()
 
     # List files
     if path == '':
         files = fs.ls(BUCKET)
-    else:
+    elif '**' in path:
         files = fs.glob(BUCKET + '/' + path)
+    else:
+        files = _glob(fs, path)
+
+    # Cut the bucket part from the path (all listed paths are in the bucket)
+    n = len(BUCKET) + 1
+
+    paths = [file[n:] for file in files]
+
+    return _cache_listing('ls_re', path, paths)
+
+
+def invalidate_listing_cache() -> None:
+    """
+    Discard the cached results of `ls` and `ls_re`, and the listings cached by the shared S3
+    file system, so that the next listings are made in S3.
+    """
+    _listing_cache.clear()
+    _get_fs().invalidate_cache()
+
 
-    # Cut the bucket part from the path
-    prefix = BUCKET + '/'
+def invalidate_info_cache(hrrr_file: str | None = None) -> None:
+    """
+    Discard the cached results of `info` for an S3 key, or for all keys if hrrr_file is None,
+    for example when an object is known to have just been published.
+    """
+    if hrrr_file is None:
+        _info_cache.clear()
+    else:
+        _info_cache.pop(hrrr_file, None)
+
+
+def _get_cached_listing(function: str, path: str) -> list[str] | None:
+    """Return a cached listing of a path, or None if there is none or it has expired."""
+    entry = _listing_cache.get((function, path))
+    if entry is None or time.monotonic() - entry[0] > LISTING_CACHE_TTL:
+        return None
+    return list(entry[1])
 
-    paths = [file[len(prefix) :] for file in files if file.startswith(prefix)]
 
+def _cache_listing(function: str, path: str, paths: list[str]) -> list[str]:
+    """Cache a listing of a path, and return it."""
+    _listing_cache[(function, path)] = (time.monotonic(), tuple(paths))
     return paths
 
 
-def download(hrrr_file: str, local_dir: Path, refresh: bool = False, verbose: bool = False) -> Path:
+def _glob(fs: s3fs.S3FileSystem, path: str) -> list[str]:
+    """
+    Expand a path with wildcards in the S3 HRRR bucket, one path segment at a time.
+
+    Only the S3 "directories" that match the path segments expanded so far are listed, and the
+    literal part of a segment before its first wildcard is passed to S3 as the listing prefix,
+    so that the server does the coarse filtering. For example, 'hrrr.2025*/conus/*' lists the
+    bucket with prefix 'hrrr.2025', followed by the 'conus' directory of each matching day.
+    A literal last segment is looked up in the listing of each matching directory, with the
+    segment as the prefix.
+    In contrast, `s3fs.S3FileSystem.glob` lists every directory down to the depth of the path.
+
+    Args:
+        fs (s3fs.S3FileSystem): S3 file system.
+        path (str): Path in the S3 HRRR bucket, without '**' wildcards.
+
+    Returns:
+        list[str]: Sorted list of matching paths, including the bucket.
+    """
+
+    segments = path.strip('/').split('/')
+
+    candidates = [BUCKET]
+
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+
+        if not _GLOB_MAGIC.search(segment):
+            if not last:
+                candidates = [candidate + '/' + segment for candidate in candidates]
+                continue
+            # The existence of the paths is checked with the listings of their directories,
+            # restricted to the last segment, rather than with one request per path
+            literal_prefix = segment
+            pattern = None
+        else:
+            literal_prefix = _GLOB_MAGIC.split(segment, maxsplit=1)[0]
+            pattern = _compile_glob_segment(segment)
+
+        matches = []
+
+        for candidate in candidates:
+            try:
+                if literal_prefix:
+                    entries = _list_with_prefix(fs, candidate, literal_prefix)
+                else:
+                    entries = fs.ls(candidate, detail=True)
+            except FileNotFoundError:
+                continue
+
+            for entry in entries:
+                name = entry['name'].rstrip('/')
+                if not last and entry['type'] != 'directory':
+                    continue
+                base_name = name.rsplit('/', 1)[-1]
+                if base_name == segment if pattern is None else pattern.match(base_name):
+                    matches.append(name)
+
+        candidates = matches
+
+    return sorted(candidates)
+
+
+def _list_with_prefix(fs: s3fs.S3FileSystem, path: str, prefix: str) -> list[dict]:
+    """
+    List the entries of an S3 "directory" whose names start with a prefix.
+
+    The prefix is passed to S3, so that only the matching keys are listed, with one
+    ListObjectsV2 request per 1000 entries. The listing is made directly rather than with
+    `s3fs.S3FileSystem.find`, which does not accept a prefix together with maxdepth before
+    s3fs 2026.3.0, and it is not stored in the listings cache of the file system, since it is
+    partial.
+
+    Args:
+        fs (s3fs.S3FileSystem): S3 file system.
+        path (str): Path of the directory, including the bucket.
+        prefix (str): Beginning of the names of the entries, without the directory.
+
+    Returns:
+        list[dict]: Entries with the fields name (including the bucket), type ('file' or
+            'directory'), size and StorageClass ('DIRECTORY' for directories), and for files
+            also ETag and LastModified.
+    """
+
+    bucket, _, key = path.strip('/').partition('/')
+
+    kwargs = {'Bucket': bucket, 'Prefix': (key + '/' if key else '') + prefix, 'Delimiter': '/'}
+
+    entries = []
+
+    while True:
+        out = fs.call_s3('list_objects_v2', **kwargs)
+
+        for common_prefix in out.get('CommonPrefixes', []):
+            entries.append(
+                {
+                    'name': bucket + '/' + common_prefix['Prefix'].rstrip('/'),
+                    'type': 'directory',
+                    'size': 0,
+                    'StorageClass': 'DIRECTORY',
+                }
+            )
+
+        for content in out.get('Contents', []):
+            entries.append(
+                {
+                    'name': bucket + '/' + content['Key'],
+                    'type': 'file',
+                    'size': content['Size'],
+                    'ETag': content['ETag'],
+                    'LastModified': content['LastModified'],
+                    'StorageClass': content.get('StorageClass', 'STANDARD'),
+                }
+            )
+
+        if not out.get('IsTruncated'):
+            return entries
+
+        kwargs['ContinuationToken'] = out['NextContinuationToken']
+
+
+@lru_cache(maxsize=256)
+def _compile_glob_segment(segment: str) -> re.Pattern:
+    """Translate a wildcard path segment into a compiled regular expression."""
+    return re.compile(fnmatch.translate(segment))
+
+
+def download(
+    hrrr_file: str,
+    local_dir: Path,
+    refresh: bool = False,
+    verbose: bool = False,
+    verify: bool = False,
+    hrrr_file_info: dict | None = None,
+) -> Path:
     """
     Download a HRRR data file from S3, unless it already exists in the local directory.
 
+    An existing local file is compared with the object in S3 by `_matches_etag`. For objects
+    uploaded in multiple parts, whose ETag is not the MD5 hash of their contents, a local file
+    is taken to be complete only if its download by this function was completed, which is
+    recorded in a file next to it with the suffix '.etag' appended. Such files downloaded by
+    earlier versions of this package are downloaded again once.
+
     Args:
         hrrr_file (str): Path of the HRRR data file in the HRRR bucket (S3 key).
         local_dir (Path): Local directory where the file will be downloaded. Created if it does not exist.
         refresh (bool, optional): If True, download even if the file already exists. Defaults to False.
         verbose (bool, optional): If True, print detailed progress information to stdout. Defaults to False.
+        verify (bool, optional): If True, compare the MD5 hash of the downloaded file with its
+            ETag in S3 (or its size, if the object was uploaded in multiple parts), and warn if
+            they differ. Defaults to False.
+        hrrr_file_info (dict, optional): Properties of the file in S3 as returned by `info`
+            (at least 'ETag' and 'size'), for example from a listing of the bucket. If None,
+            they are retrieved with `info`. Defaults to None.
 
     Returns:
         Path: Local path of the downloaded file.
     """
 
     # Create local directory unless it exists
-    path = Path(local_dir)
-    path.mkdir(parents=True, exist_ok=True)
+    Path(local_dir).mkdir(parents=True, exist_ok=True)
+
+    fs = _get_fs()
+
+    return sync(
+        fs.loop, _download_async, hrrr_file, local_dir, refresh, verbose, verify, hrrr_file_info
+    )
 
-    # Local file path
+
+async def _download_async(
+    hrrr_file: str,
+    local_dir: Path,
+    refresh: bool = False,
+    verbose: bool = False,
+    verify: bool = False,
+    hrrr_file_info: dict | None = None,
+) -> Path:
+    """
+    Download a HRRR data file from S3, as `download`, in a coroutine on the event loop of the
+    shared S3 file system. The MD5 hashes of local files are computed in a separate thread,
+    so that other downloads on the event loop continue meanwhile.
+    """
+
+    # Local file path. Its directory is created when the file is downloaded.
     local_file = Path(local_dir) / hrrr_file  # Path will normalize separators for the OS
 
-    # Get the ETag of the object from S3 (remove surrounding double quotes)
-    ETag = info(hrrr_file)['ETag'].strip('"')
+    # Get the ETag and size of the object from S3 (remove surrounding double quotes from the
+    # ETag), with one HEAD request unless they were given. They are used both for the check of
+    # an existing local file and for the download.
+    if hrrr_file_info is None:
+        hrrr_file_info = await _info_async(hrrr_file)
+    ETag = hrrr_file_info['ETag'].strip('"')
+    size = hrrr_file_info['size']
 
     # Check if file already exists and is the same as the file in S3
-    if not refresh and local_file.exists():
-        # Compare the MD5 hash with its ETag from S3
-        checksum = md5sum(local_file)
-
-        if ETag == checksum:
-            if verbose:
-                print(
-                    BUCKET + '/' + hrrr_file,
-                    'already available locally as ',
-                    str(local_file),
-                    '. Skipping download.',
-                    flush=True,
-                )
-            return local_file
+    if (
+        not refresh
+        and local_file.exists()
+        and await asyncio.to_thread(_matches_etag, local_file, ETag, size)
+    ):
+        if verbose:
+            print(
+                f'{BUCKET}/{hrrr_file} already available locally as {local_file}. '
+                'Skipping download.',
+                flush=True,
+            )
+        return local_file
 
     if verbose:
-        print('Downloading from the NOAA HRRR S3 archive the file', local_file, flush=True)
-
-    # Download the file from S3
-    fs = s3fs.S3FileSystem(anon=True)
-    fs.get(BUCKET + '/' + hrrr_file, str(local_file))
+        print(f'Downloading from the NOAA HRRR S3 archive the file {local_file}', flush=True)
+
+    # Download the file from S3. Large files are downloaded in concurrent byte ranges, because the
+    # throughput of a single GET request is limited by its TCP connection. Their MD5 hash is then
+    # computed from the received data, if needed.
+    checksum = None
+    if size >= MULTIPART_THRESHOLD:
+        checksum = await _get_multipart_async(
+            hrrr_file, local_file, size, md5=verify and '-' not in ETag
+        )
+    else:
+        fs = _get_fs()
+        local_file.parent.mkdir(parents=True, exist_ok=True)
+        # Downloaded to a temporary file, so that an incomplete download is never left under
+        # the name of the local file
+        part_file = local_file.with_name(local_file.name + '.part')
+        try:
+            await fs._get_file(BUCKET + '/' + hrrr_file, str(part_file))
+            part_file.replace(local_file)
+        finally:
+            if part_file.exists():
+                part_file.unlink()
+
+    # The contents of an object uploaded in multiple parts cannot be checked against its ETag,
+    # so the completed download is recorded instead, for later checks of the local file
+    if '-' in ETag and local_file.stat().st_size == size:
+        await asyncio.to_thread(_write_etag_record, local_file, ETag)
+
+    if not verify:
+        return local_file
 
     # Check if the downloaded file matches the file in S3
-    checksum = md5sum(local_file)
-
-    if ETag != checksum:
+    if not await asyncio.to_thread(_matches_etag, local_file, ETag, size, checksum):
         message = (
-            'Download may have failed: ETag of local file '
-            + str(local_file)
-            + ' does not match ETag of S3 file '
-            + BUCKET
-            + '/'
-            + hrrr_file
+            f'Download may have failed: ETag of local file {local_file} '
+            f'does not match ETag of S3 file {BUCKET}/{hrrr_file}'
         )
         warnings.warn(message, stacklevel=2)
         # raise Exception(message)
@@ -148,12 +441,58 @@ def download(hrrr_file: str, local_dir: Path, refresh: bool = False, verbose: bo
     return local_file
 
 
+def download_striped(
+    hrrr_file: str,
+    local_dir: Path,
+    n_parts: int | None = None,
+    part_size: int | None = None,
+    verbose: bool = False,
+) -> Path:
+    """
+    Download a HRRR data file from S3 with concurrent byte-range requests, whatever its size.
+
+    `download` uses byte-range requests for files of at least MULTIPART_THRESHOLD bytes, with
+    the default number and size of the byte ranges. This function allows to choose them, for
+    example more concurrent requests on a fast network for large files (wrfnat, wrfprs).
+    The file is always downloaded, even if it already exists locally.
+
+    Args:
+        hrrr_file (str): Path of the HRRR data file in the HRRR bucket (S3 key).
+        local_dir (Path): Local directory where the file will be downloaded. Created if it does not exist.
+        n_parts (int, optional): Maximum number of concurrent byte-range requests. If None,
+            MAX_CONCURRENCY.
+        part_size (int, optional): Size of the byte ranges in bytes. If None, MULTIPART_CHUNKSIZE.
+        verbose (bool, optional): If True, print detailed progress information to stdout. Defaults to False.
+
+    Returns:
+        Path: Local path of the downloaded file.
+    """
+
+    local_file = Path(local_dir) / hrrr_file
+
+    hrrr_file_info = info(hrrr_file)
+    ETag = hrrr_file_info['ETag'].strip('"')
+    size = hrrr_file_info['size']
+
+    if verbose:
+        print(f'Downloading from the NOAA HRRR S3 archive the file {local_file}', flush=True)
+
+    _get_multipart(hrrr_file, local_file, size, part_size=part_size, n_parts=n_parts)
+
+    # Record the completed download of an object uploaded in multiple parts (see `download`)
+    if '-' in ETag and local_file.stat().st_size == size:
+        _write_etag_record(local_file, ETag)
+
+    return local_file
+
+
 def download_threaded(
     hrrr_files: list[str],
     local_dir: Path,
     refresh: bool = False,
     n_jobs: int = 1,
     verbose: bool = False,
+    verify: bool = False,
 ) -> Path:
     """
      Download a list of HRRR data file from S3, except those that already exists in the local directory,
@@ -165,28 +504,135 @@ def download_threaded(
         refresh (bool, optional): If True, download even if the file already exists. Defaults to False.
         n_jobs (int, optional): Maximum number of parallel downloads. Defaults to 1.
         verbose (bool, optional): If True, print detailed progress information to stdout. Defaults to False.
+        verify (bool, optional): If True, compare the MD5 hash of each downloaded file with its ETag in S3. Defaults to False.
     Returns:
-        list[str]: List of local paths of the downloaded files.
+        list[str]: List of local paths of the downloaded files, in the order of `hrrr_files`.
+    """
+
+    downloaded = set(
+        download_threaded_iter(
+            hrrr_files, local_dir, refresh=refresh, n_jobs=n_jobs, verbose=verbose, verify=verify
+        )
+    )
+
+    local_files = [Path(local_dir) / hrrr_file for hrrr_file in hrrr_files]
+
+    return [local_file for local_file in local_files if local_file in downloaded]
+
+
+def download_threaded_iter(
+    hrrr_files: list[str],
+    local_dir: Path,
+    refresh: bool = False,
+    n_jobs: int = 1,
+    verbose: bool = False,
+    verify: bool = False,
+) -> Iterator[Path]:
+    """
+    Download a list of HRRR data file from S3, except those that already exists in the local directory,
+    in parallel, and yield the local path of each file as soon as its download has completed.
+
+    This allows callers to start processing a file while the remaining files are still being
+    downloaded.
+
+    Args:
+        hrrr_file (list[str]): List of paths of the HRRR data file in the HRRR bucket (S3 key).
+        local_dir (Path): Local directory where the file will be downloaded. Created if it does not exist.
+        refresh (bool, optional): If True, download even if the file already exists. Defaults to False.
+        n_jobs (int, optional): Maximum number of parallel downloads. Defaults to 1.
+        verbose (bool, optional): If True, print detailed progress information to stdout. Defaults to False.
+        verify (bool, optional): If True, compare the MD5 hash of each downloaded file with its ETag in S3. Defaults to False.
+    Yields:
+        Path: Local path of a downloaded file, in the order in which the downloads complete.
     """
 
     if n_jobs is None:
         n_jobs = 1
 
-    local_files = []
+    # Create local directory unless it exists, once for all files
+    Path(local_dir).mkdir(parents=True, exist_ok=True)
+
+    # The downloads run as coroutines on the event loop of the shared S3 file system, at most
+    # n_jobs at a time, rather than in a thread each
+    fs = _get_fs()
+    semaphore = asyncio.Semaphore(n_jobs)
+
+    # Properties of files in the same S3 "directory", listed together rather than with one
+    # HEAD request per file
+    hrrr_files_info = _prefetch_info(hrrr_files)
+
+    async def download_limited(hrrr_file: str) -> Path:
+        async with semaphore:
+            return await _download_async(
+                hrrr_file, local_dir, refresh, verbose, verify, hrrr_files_info.get(hrrr_file)
+            )
+
+    futures = [
+        asyncio.run_coroutine_threadsafe(download_limited(hrrr_file), fs.loop)
+        for hrrr_file in hrrr_files
+    ]
 
-    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
-        futures = [
-            executor.submit(download, hrrr_file, local_dir, refresh, verbose)
-            for hrrr_file in hrrr_files
-        ]
+    try:
         for future in as_completed(futures):
             try:
                 local_file = future.result()
-                local_files.append(local_file)
+            except FileNotFoundError as exc:
+                print(f"File not available in the S3 bucket {BUCKET}: {exc}", flush=True)
+                continue
             except Exception as exc:
                 print(f"Download generated an exception: {exc}", flush=True)
+                continue
+            yield local_file
+    finally:
+        # Cancel the remaining downloads if the caller stops iterating
+        for future in futures:
+            future.cancel()
+
+
+def _prefetch_info(hrrr_files: list[str]) -> dict[str, dict]:
+    """
+    Retrieve the properties (ETag, size, etc.) of HRRR data files in S3 with listings of the
+    bucket, one per S3 "directory" that contains two or more of the files.
+
+    Each listing is restricted to the keys that start with the longest common prefix of the
+    file names in the directory (see `_list_with_prefix`), so that it is not paginated through
+    the other files of the directory. Files that are alone in their directory are left to a HEAD request, which is
+    no more expensive than a listing.
 
-    return local_files
+    Args:
+        hrrr_files (list[str]): List of paths of the HRRR data files in the HRRR bucket (S3 keys).
+
+    Returns:
+        dict[str, dict]: Properties of the listed files by path, as returned by `info`.
+    """
+
+    fs = _get_fs()
+
+    directories = {}
+    for hrrr_file in hrrr_files:
+        directory, _, file_name = hrrr_file.rpartition('/')
+        directories.setdefault(directory, set()).add(file_name)
+
+    hrrr_files_info = {}
+
+    for directory, file_names in directories.items():
+        if len(file_names) < 2:
+            continue
+
+        try:
+            entries = _list_with_prefix(
+                fs, BUCKET + '/' + directory, os.path.commonprefix(sorted(file_names))
+            )
+        except FileNotFoundError:
+            # The files are then looked up with HEAD requests by `download`
+            continue
+
+        for entry in entries:
+            hrrr_file = entry['name'][len(BUCKET) + 1 :]
+            if hrrr_file.rpartition('/')[2] in file_names and 'ETag' in entry:
+                hrrr_files_info[hrrr_file] = entry
+
+    return hrrr_files_info
 
 
 def download_date_range(
@@ -200,6 +646,7 @@ def download_date_range(
     refresh: bool = False,
     n_jobs: int = 1,
     verbose: bool = False,
+    verify: bool = False,
 ) -> list[Path]:
     """
     Downloads HRRR data files from S3 starting between (inclusive) given start and end dates,
@@ -216,76 +663,474 @@ def download_date_range(
         refresh (bool, optional): If True, download even if the file already exists. Defaults to False.
         n_jobs (int, optional): Maximum number of parallel downloads, Defaults to 1.
         verbose (bool, optional): If True, print detailed progress information to stdout. Defaults to False.
+        verify (bool, optional): If True, compare the MD5 hash of each downloaded file with its ETag in S3. Defaults to False.
 
     Returns:
-        list[Path]: List of local paths of the downloaded files.
+        list[Path]: List of local paths of the downloaded files, ordered by date.
+
+    Notes:
+        The S3 keys of the data files follow from the arguments, so no listing of the bucket
+        is needed: each file is looked up with a single HEAD request. Files that are not
+        available in the bucket are reported and skipped.
     """
 
-    # Construct the paths (S3 keys) of the data files
+    downloaded = set(
+        download_date_range_iter(
+            start_date,
+            end_date,
+            region,
+            init_hour,
+            forecast_lead_hour,
+            data_type,
+            local_dir,
+            refresh=refresh,
+            n_jobs=n_jobs,
+            verbose=verbose,
+            verify=verify,
+        )
+    )
+
+    # The S3 keys, and hence the local paths, sort in the order of the dates
+    return sorted(downloaded)
+
+
+def download_date_range_iter(
+    start_date: datetime,
+    end_date: datetime,
+    region: str,
+    init_hour: int,
+    forecast_lead_hour: int,
+    data_type: str,
+    local_dir: Path,
+    refresh: bool = False,
+    n_jobs: int = 1,
+    verbose: bool = False,
+    verify: bool = False,
+) -> Iterator[Path]:
+    """
+    Downloads HRRR data files from S3 starting between (inclusive) given start and end dates,
+    in parallel, and yields the local path of each file as soon as its download has completed.
+
+    Args:
+        start_date (datetime): The date of the first data file
+        end_data (datetime): The date of the last data file
+        region (str): One of 'alaska','conus'
+        init_hour (int): Simulation initialization hour (UTC)
+        forecast_lead_hour (int): Forecast lead time in hours
+        data_type (str): A string specifying the data type in NOWW S3 HRRR data file name, e.g. 'wrfsfc'.
+        local_dir (Path): Local directory where the files will be downloaded. Created if it does not exist.
+        refresh (bool, optional): If True, download even if the file already exists. Defaults to False.
+        n_jobs (int, optional): Maximum number of parallel downloads, Defaults to 1.
+        verbose (bool, optional): If True, print detailed progress information to stdout. Defaults to False.
+        verify (bool, optional): If True, compare the MD5 hash of each downloaded file with its ETag in S3. Defaults to False.
 
-    hrrr_files = []
+    Yields:
+        Path: Local path of a downloaded file, in the order in which the downloads complete.
+    """
 
-    date = start_date
+    # Construct the paths (S3 keys) of the data files. The file name is the same on each date.
 
-    while date <= end_date:
-        hrrr_file = 'hrrr.'
-        hrrr_file = hrrr_file + str(date.year) + str(date.month).zfill(2) + str(date.day).zfill(2)
-        hrrr_file = hrrr_file + '/'
-        hrrr_file = hrrr_file + region
-        hrrr_file = hrrr_file + '/'
-        hrrr_file = hrrr_file + 'hrrr.t'
-        hrrr_file = hrrr_file + str(init_hour).zfill(2)
-        hrrr_file = hrrr_file + 'z.'
-        hrrr_file = hrrr_file + data_type
-        hrrr_file = hrrr_file + 'f'
-        hrrr_file = hrrr_file + str(forecast_lead_hour).zfill(2)
-        hrrr_file = hrrr_file + '.grib2'
+    file_name = f'hrrr.t{init_hour:02d}z.{data_type}f{forecast_lead_hour:02d}.grib2'
 
-        hrrr_files.append(hrrr_file)
+    n_days = (end_date - start_date).days + 1
 
-        date += timedelta(days=1)
+    hrrr_files = [
+        f'hrrr.{start_date + timedelta(days=day):%Y%m%d}/{region}/{file_name}'
+        for day in range(n_days)
+    ]
 
     # Download files
 
-    local_files = []
-
-    local_files = download_threaded(
-        hrrr_files, local_dir, refresh=refresh, n_jobs=n_jobs, verbose=verbose
+    yield from download_threaded_iter(
+        hrrr_files, local_dir, refresh=refresh, n_jobs=n_jobs, verbose=verbose, verify=verify
     )
 
-    return local_files
-
 
 def info(hrrr_file: str) -> dict:
     """
 
-    Retrieves properties of an object in the S3 HRRR bucket.
+    Retrieves properties of an object or an S3 "directory" in the S3 HRRR bucket.
+
+    The properties of an object are obtained with a single HEAD request, which does not
+    transfer the object itself. If there is no object with the path, the path is looked up as
+    a directory in a listing of its parent directory, restricted to the last path segment.
 
     Args:
         hrrr_file (str): Path of the HRRR data file in the HRRR bucket (S3 key).
 
     Returns:
-        dict: Dictionary containing S3 object properties, as returned by
-              `s3fs.S3FileSystem.info`. Includes fields like size, last_modified,
-              ETag, and Metadata (user-defined metadata).
+        dict: Dictionary containing S3 object properties, with the same fields as returned
+              by `s3fs.S3FileSystem.info` for a file: ETag, LastModified, size, name, type,
+              StorageClass, VersionId, and ContentType. For a directory, the fields are
+              name, type ('directory'), size (0) and StorageClass ('DIRECTORY').
 
               The units of size are bytes, the time is given as UTC,
               at the time of writing this code.
 
+    Raises:
+        FileNotFoundError: If neither the object nor the directory exist in the bucket.
+
+    Notes:
+        The properties are reused for INFO_CACHE_TTL seconds, and the absence of an object
+        for INFO_MISS_CACHE_TTL seconds (see `invalidate_info_cache`).
+
     """
 
-    fs = s3fs.S3FileSystem(anon=True)
-    info = fs.info(BUCKET + '/' + hrrr_file)
+    info = _get_cached_info(hrrr_file)
+    if info is not None:
+        return info
+
+    fs = _get_fs()
+
+    try:
+        out = fs.call_s3('head_object', Bucket=BUCKET, Key=hrrr_file)
+    except FileNotFoundError:
+        path = BUCKET + '/' + hrrr_file.strip('/')
+        parent, _, name = path.rpartition('/')
+        for entry in _list_with_prefix(fs, parent, name):
+            if entry['name'] == path and entry['type'] == 'directory':
+                return _cache_info(hrrr_file, entry)
+        _info_cache[hrrr_file] = (time.monotonic(), None)
+        raise
+
+    return _cache_info(hrrr_file, _info_from_head(hrrr_file, out))
+
+
+async def _info_async(hrrr_file: str) -> dict:
+    """
+    Retrieve properties of an object in the S3 HRRR bucket, as `info`, in a coroutine. Paths
+    of directories are not looked up, and raise FileNotFoundError.
+    """
+
+    info = _get_cached_info(hrrr_file)
+    if info is not None:
+        return info
+
+    fs = _get_fs()
+
+    try:
+        out = await fs._call_s3('head_object', Bucket=BUCKET, Key=hrrr_file)
+    except FileNotFoundError:
+        _info_cache[hrrr_file] = (time.monotonic(), None)
+        raise
+
+    return _cache_info(hrrr_file, _info_from_head(hrrr_file, out))
+
+
+def _get_cached_info(hrrr_file: str) -> dict | None:
+    """
+    Return the cached properties of an object, or None if there are none or they have expired.
+    Raises FileNotFoundError if the object was recently found not to exist.
+    """
+    entry = _info_cache.get(hrrr_file)
+    if entry is None:
+        return None
+    retrieved, info = entry
+    age = time.monotonic() - retrieved
+    if info is None:
+        if age <= INFO_MISS_CACHE_TTL:
+            raise FileNotFoundError(BUCKET + '/' + hrrr_file)
+        return None
+    if age > INFO_CACHE_TTL:
+        return None
+    return dict(info)
+
+
+def _cache_info(hrrr_file: str, info: dict) -> dict:
+    """Cache the properties of an object, and return them."""
+    _info_cache[hrrr_file] = (time.monotonic(), dict(info))
+    return info
+
+
+def _info_from_head(hrrr_file: str, out: dict) -> dict:
+    """Return the properties of an object, as returned by `info`, from a HEAD response."""
+
+    info = {
+        'ETag': out.get('ETag', ''),
+        'LastModified': out.get('LastModified', ''),
+        'size': out['ContentLength'],
+        'name': BUCKET + '/' + hrrr_file,
+        'type': 'file',
+        'StorageClass': out.get('StorageClass', 'STANDARD'),
+        'VersionId': out.get('VersionId'),
+        'ContentType': out.get('ContentType'),
+    }
 
     return info
 
 
+def configure(
+    block_size: int | None = None,
+    max_pool_connections: int | None = None,
+    multipart_threshold: int | None = None,
+    multipart_chunksize: int | None = None,
+    max_concurrency: int | None = None,
+) -> None:
+    """
+    Set the transfer parameters of this module. Parameters that are None are left unchanged.
+
+    The shared S3 file system is created again with the new parameters on its next use.
+
+    Args:
+        block_size (int, optional): Block size (bytes) of files opened for reading (DEFAULT_BLOCK_SIZE).
+        max_pool_connections (int, optional): Maximum number of pooled HTTP connections of the
+            shared S3 client (MAX_POOL_CONNECTIONS).
+        multipart_threshold (int, optional): Size (bytes) from which files are downloaded with
+            concurrent byte-range requests (MULTIPART_THRESHOLD).
+        multipart_chunksize (int, optional): Size (bytes) of the byte ranges (MULTIPART_CHUNKSIZE).
+        max_concurrency (int, optional): Maximum number of concurrent byte-range requests per
+            file (MAX_CONCURRENCY).
+    """
+
+    global DEFAULT_BLOCK_SIZE, MAX_POOL_CONNECTIONS
+    global MULTIPART_THRESHOLD, MULTIPART_CHUNKSIZE, MAX_CONCURRENCY
+
+    if block_size is not None:
+        DEFAULT_BLOCK_SIZE = block_size
+    if max_pool_connections is not None:
+        MAX_POOL_CONNECTIONS = max_pool_connections
+    if multipart_threshold is not None:
+        MULTIPART_THRESHOLD = multipart_threshold
+    if multipart_chunksize is not None:
+        MULTIPART_CHUNKSIZE = multipart_chunksize
+    if max_concurrency is not None:
+        MAX_CONCURRENCY = max_concurrency
+
+    _get_fs.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def _get_fs() -> s3fs.S3FileSystem:
+    """
+    Return the anonymous S3 file system shared by all functions in this module.
+
+    Sharing one instance lets all requests, including those from parallel downloads, reuse
+    the same S3 client and its pool of HTTP connections. The requests are unsigned (the
+    bucket is public), and the connection pool is sized for parallel downloads.
+    """
+    return s3fs.S3FileSystem(
+        anon=True,
+        default_block_size=DEFAULT_BLOCK_SIZE,
+        config_kwargs={
+            'max_pool_connections': MAX_POOL_CONNECTIONS,
+            'retries': RETRIES,
+            'tcp_keepalive': True,
+        },
+    )
+
+
+def _get_multipart(
+    hrrr_file: str,
+    local_file: Path,
+    size: int,
+    part_size: int | None = None,
+    n_parts: int | None = None,
+    md5: bool = False,
+) -> str | None:
+    """
+    Download a HRRR data file from S3 with concurrent byte-range requests, with
+    `_get_multipart_async` on the event loop of the shared S3 file system.
+    """
+
+    fs = _get_fs()
+
+    return sync(fs.loop, _get_multipart_async, hrrr_file, local_file, size, part_size, n_parts, md5)
+
+
+async def _get_multipart_async(
+    hrrr_file: str,
+    local_file: Path,
+    size: int,
+    part_size: int | None = None,
+    n_parts: int | None = None,
+    md5: bool = False,
+) -> str | None:
+    """
+    Download a HRRR data file from S3 with concurrent byte-range requests.
+
+    The byte-range requests are issued as coroutines on the event loop of the shared S3 file
+    system, at most n_parts at a time, so that they reuse its pool of HTTP connections
+    without a thread per request. The byte ranges are written to a temporary file next to the
+    local file, with the suffix '.part' appended, which is allocated at its full size first;
+    each byte range is written at its offset as soon as it has been received, in a worker
+    thread, so that the event loop (and the other downloads on it) do not wait for the disk.
+    At most n_parts byte ranges are therefore held in memory. The temporary file replaces the
+    local file only when all byte ranges have been written. If a request fails, the other
+    requests are cancelled and the temporary file is removed, so that an incomplete download
+    is never left under the name of the local file.
+
+    If requested, the MD5 hash of the file is computed from the complete temporary file, in
+    a worker thread, while it is still in the page cache.
+
+    Args:
+        hrrr_file (str): Path of the HRRR data file in the HRRR bucket (S3 key).
+        local_file (Path): Local path of the downloaded file.
+        size (int): Size of the HRRR data file in bytes.
+        part_size (int, optional): Size of the byte ranges in bytes. If None, MULTIPART_CHUNKSIZE.
+        n_parts (int, optional): Maximum number of concurrent byte-range requests. If None,
+            MAX_CONCURRENCY.
+        md5 (bool, optional): If True, compute the MD5 hash of the file. Defaults to False.
+
+    Returns:
+        str | None: Hexadecimal MD5 hash of the file if md5 is True, otherwise None.
+    """
+
+    if part_size is None:
+        part_size = MULTIPART_CHUNKSIZE
+    if n_parts is None:
+        n_parts = MAX_CONCURRENCY
+
+    fs = _get_fs()
+    s3_path = BUCKET + '/' + hrrr_file
+
+    local_file.parent.mkdir(parents=True, exist_ok=True)
+
+    semaphore = asyncio.Semaphore(n_parts)
+
+    async def get_range(fd: int, start: int) -> None:
+        end = min(start + part_size, size)
+        # The byte range is held until it has been written, so that at most n_parts are in memory
+        async with semaphore:
+            data = await fs._cat_file(s3_path, start=start, end=end)
+            await asyncio.to_thread(_write_at, fd, data, start)
+
+    part_file = local_file.with_name(local_file.name + '.part')
+
+    checksum = None
+
+    try:
+        fd = os.open(part_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0))
+        try:
+            os.ftruncate(fd, size)
+            tasks = [
+                asyncio.ensure_future(get_range(fd, start)) for start in range(0, size, part_size)
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # Stop the remaining requests before the file is closed
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        finally:
+            os.close(fd)
+
+        if md5:
+            checksum = await asyncio.to_thread(md5sum, part_file)
+
+        part_file.replace(local_file)
+    finally:
+        if part_file.exists():
+            part_file.unlink()
+
+    return checksum
+
+
+def _write_at(fd: int, data: bytes, offset: int) -> None:
+    """
+    Write data to a file descriptor at an offset, so that several threads can write to the
+    same file at once. Where os.pwrite is not available (Windows), the position of the file
+    is moved and the data are written under a lock.
+    """
+
+    view = memoryview(data)
+
+    if hasattr(os, 'pwrite'):
+        while view:
+            n = os.pwrite(fd, view, offset)
+            view = view[n:]
+            offset += n
+        return
+
+    with _write_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        while view:
+            view = view[os.write(fd, view) :]
+
+
+def _matches_etag(local_file: Path, ETag: str, size: int, checksum: str | None = None) -> bool:
+    """
+    Check if a local file matches an object in S3, given the ETag and size of the object.
+
+    The ETag of an object uploaded in a single part is the MD5 hash of its contents, which is
+    compared with that of the local file. When they match, the ETag is recorded with the size
+    and modification time of the file in a file next to it, with the suffix '.etag' appended
+    (see `_write_etag_record`). Later checks of the unmodified file against the same ETag are
+    made with the record, without reading the file again (HRRR objects do not change once
+    they are published).
+
+    The ETag of an object uploaded in multiple parts ('<hash>-<number of parts>') is not the
+    MD5 hash of its contents, and depends on the unknown part size. A local file matches such
+    an object only if its record has been written after a completed download (by
+    `download`), since a file of the right size may also be left by an interrupted download
+    into a preallocated file.
+
+    Args:
+        local_file (Path): Path to a local file.
+        ETag (str): ETag of the object in S3, without surrounding double quotes.
+        size (int): Size of the object in S3 in bytes.
+        checksum (str, optional): MD5 hash of the local file, if already known. If None, it is
+            computed from the file if needed. Defaults to None.
+
+    Returns:
+        bool: True if the local file matches the object.
+    """
+
+    stat = local_file.stat()
+
+    etag_file = local_file.with_name(local_file.name + '.etag')
+    record = {'ETag': ETag, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    try:
+        recorded = json.loads(etag_file.read_text()) == record
+    except (OSError, ValueError):
+        recorded = False
+
+    if '-' in ETag:
+        return recorded and stat.st_size == size
+
+    if checksum is None:
+        if recorded:
+            return True
+
+        checksum = md5sum(local_file)
+
+    if checksum != ETag:
+        return False
+
+    _write_etag_record(local_file, ETag)
+
+    return True
+
+
+def _write_etag_record(local_file: Path, ETag: str) -> None:
+    """
+    Record that a local file matches the object in S3 with a given ETag, in a file next to it
+    with the suffix '.etag' appended, together with the size and modification time of the
+    local file (see `_matches_etag`). Errors writing the record are ignored.
+
+    Args:
+        local_file (Path): Path to a local file.
+        ETag (str): ETag of the object in S3, without surrounding double quotes.
+    """
+
+    stat = local_file.stat()
+
+    record = {'ETag': ETag, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    with contextlib.suppress(OSError):
+        local_file.with_name(local_file.name + '.etag').write_text(json.dumps(record))
+
+
 def md5sum(local_file: Path):
     """Compute the MD5 hash of a file's contents.
 
     This function reads the file in binary mode and processes it in
     fixed-size chunks to compute the MD5 checksum efficiently, without
-    loading the entire file into memory.
+    loading the entire file into memory. The read and hash loop runs in
+    C (`hashlib.file_digest`), which releases the GIL while hashing, so
+    that files can be checked in parallel threads.
 
     Args:
         local_file (str): Path to a local file.
@@ -295,10 +1140,5 @@ def md5sum(local_file: Path):
 
     """
 
-    h = hashlib.md5()
-
     with open(local_file, 'rb') as f:
-        for chunk in iter(lambda: f.read(8192), b''):
-            h.update(chunk)
-
-    return h.hexdigest()
+        return hashlib.file_digest(f, 'md5').hexdigest()
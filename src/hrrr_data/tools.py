@@ -2,13 +2,72 @@
 Tools for operations on files in GRIB and netCDF format.
 '''
 
+import json
+import os
 import warnings
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import product
 from pathlib import Path
 
 import numpy as np
 import pygrib
 import xarray as xr
-from netCDF4 import Dataset
+from netCDF4 import Dataset, date2num
+
+# Compression of the variables in the netCDF files written by this module. Level 1 of zlib
+# compression achieves most of the size reduction of higher levels at a fraction of their cost.
+
+_NC_COMPRESSION = {'compression': 'zlib', 'complevel': 1, 'shuffle': True}
+
+# Maximum chunk size along each horizontal grid dimension in the netCDF files written by this
+# module. Chunks of 512 x 512 float32 values (1 MiB) are large enough to compress well, and
+# small enough to fit into the default HDF5 chunk cache.
+
+_NC_CHUNK_SIZE = 512
+
+# Maximum chunk size along the time dimension in the netCDF files written by combine_netcdf.
+# Time series at a grid point are read from few chunks, while a chunk remains small enough
+# (24 x 512 x 512 float32 values, 24 MiB) to be written and read in one piece.
+
+_NC_TIME_CHUNK_SIZE = 24
+
+# Encoding keys with which variables are stored packed (as integers, or with a fill value),
+# kept from the input when variables are rewritten to a netCDF file
+
+_NC_PACKING_KEYS = ('dtype', 'scale_factor', 'add_offset', '_FillValue', 'missing_value')
+
+# Global attributes of the netCDF files written by this module
+
+_NC_GLOBAL_ATTRS = {
+    'model': 'HRRR',
+    'processed_with': 'https://github.com/jankazil/hrrr-data',
+}
+
+# Attributes of the latitude and longitude coordinates in the netCDF files written by this module
+
+_NC_LATITUDE_ATTRS = {'long_name': 'latitude', 'units': 'degrees_north'}
+_NC_LONGITUDE_ATTRS = {'long_name': 'longitude', 'units': 'degrees_east'}
+
+# Wind speed variables split by nc2nc_process_wind_speed, the names and long names of the
+# variables they are split into, and the attributes copied to these variables
+
+_WIND_VARS = ('UGRD_P0_L103_GLC0', 'VGRD_P0_L103_GLC0')
+_WIND_VAR_NAMES = ('U', 'V')
+_WIND_VAR_LONG_NAMES = ('West-east wind speed', 'South-north wind speed')
+_WIND_ATTRS_TO_COPY = (
+    'initial_time',
+    'forecast_time_units',
+    'forecast_time',
+    'level_type',
+    'parameter_template_discipline_category_number',
+    'parameter_discipline_and_category',
+    'grid_type',
+    'units',
+    'production_status',
+    'center',
+)
 
 # GRIB fields to extract into netCDF files
 
@@ -55,26 +114,155 @@ _SFC_GRIB_FIELDS = {
     },
 }
 
+# Wind speed derived from the wind components of _SFC_GRIB_FIELDS, its long name, and the GRIB2
+# parameter number of wind speed (discipline 0, parameter category 2)
+
+_SFC_WIND_SPEED_VAR = 'WS10'
+_SFC_WIND_SPEED_LONG_NAME = 'Wind speed at 10.0 m'
+_SFC_WIND_SPEED_COMPONENTS = ('U10', 'V10')
+_SFC_WIND_SPEED_PARAMETER_NUMBER = 1
+
+# Minimum number of values from which _hypot computes in several threads. NumPy releases the GIL
+# in ufuncs, so blocks of rows are computed in parallel; below this size, the cost of starting
+# the threads exceeds the gain.
+
+_PARALLEL_MIN_SIZE = 1_000_000
+
 
-def grib_list_vars(file: Path) -> dict[str, str]:
+def grib_list_vars(
+    file: Path, filters: dict[str, Iterable] | None = None, expected: set[str] | None = None
+) -> dict[str, str]:
     '''
     Returns variable names and their descriptive names as found in a GRIB file.
 
     Args:
         file (Path): Local file path to a GRIB file
+        filters (dict[str, Iterable], optional): If given, only the variables of the GRIB
+            messages whose ecCodes keys have one of the given values are returned, for example
+            {'typeOfLevel': ['heightAboveGround'], 'level': [2, 10]}. Defaults to None.
+        expected (set[str], optional): If given, the file is read only until all these
+            variable names have been found, and the variables found until then are returned
+            (all variables, if any of them is missing). Defaults to None.
 
     Returns:
         dict [str,str]: Dictionary of variable names and their descriptive names
+
+    Notes:
+        If the ecCodes Python bindings (eccodes) are installed, only the headers of the GRIB
+        messages are read, and only the two keys are decoded from each. Otherwise, the
+        messages are read with pygrib.
+
+        The result is saved next to the GRIB file, in a file with the suffix '.vars.json'
+        appended, and read from there by later calls, unless the GRIB file is newer.
+
+        With filters, the matching messages are looked up in an index of the file built by
+        pygrib.index, so that only these messages are read, and the result is not saved.
+        Results cut short by expected are not saved either.
+    '''
+
+    file = Path(file)
+
+    if filters is not None:
+        return _grib_list_vars_indexed(file, filters)
+
+    sidecar = file.with_name(file.name + '.vars.json')
+
+    try:
+        if sidecar.stat().st_mtime >= file.stat().st_mtime:
+            return json.loads(sidecar.read_text())
+    except (OSError, ValueError):
+        pass
+
+    vars = _grib_list_vars(file, expected=expected)
+
+    if expected is not None and expected.issubset(vars):
+        # The file may not have been read to the end
+        return vars
+
+    # Written to a temporary file first, so that a concurrent call never reads a partial file
+    try:
+        tmp_sidecar = sidecar.with_name(f'{sidecar.name}.{os.getpid()}.tmp')
+        tmp_sidecar.write_text(json.dumps(vars))
+        tmp_sidecar.replace(sidecar)
+    except OSError:
+        pass
+
+    return vars
+
+
+def _grib_list_vars_indexed(file: Path, filters: dict[str, Iterable]) -> dict[str, str]:
+    '''
+    Returns variable names and their descriptive names of the GRIB messages in a file that
+    match the given filters (see grib_list_vars).
+    '''
+
+    vars = {}  # A dictionary mapping the variables -> descriptive names
+
+    keys = list(filters)
+    idx = pygrib.index(str(file), *keys)
+
+    try:
+        for values in product(*filters.values()):
+            try:
+                grbs = idx.select(**dict(zip(keys, values, strict=True)))
+            except ValueError:
+                # No message matches this combination of values
+                continue
+
+            for grb in grbs:
+                if grb.shortName not in vars:
+                    vars[grb.shortName] = grb.name
+    finally:
+        idx.close()
+
+    return vars
+
+
+def _grib_list_vars(file: Path, expected: set[str] | None = None) -> dict[str, str]:
+    '''
+    Returns variable names and their descriptive names as found in a GRIB file, read from the
+    file (see grib_list_vars). If expected is given, stops reading once all of these variables
+    have been found.
     '''
 
+    # Number of expected variables not yet found
+    n_missing = len(expected) if expected is not None else -1
+
     vars = {}  # A dictionary mapping the variables -> descriptive names
 
+    try:
+        import eccodes
+    except ImportError:
+        eccodes = None
+
+    if eccodes is not None:
+        with open(file, 'rb') as f:
+            while (gid := eccodes.codes_grib_new_from_file(f, headers_only=True)) is not None:
+                try:
+                    short_name = eccodes.codes_get(gid, 'shortName')
+                    if short_name not in vars:
+                        vars[short_name] = eccodes.codes_get(gid, 'name')
+                        if expected is not None and short_name in expected:
+                            n_missing -= 1
+                finally:
+                    eccodes.codes_release(gid)
+
+                if n_missing == 0:
+                    break
+
+        return vars
+
     with pygrib.open(str(file)) as grbs:
         # pygrib.open returns a file-like object (a pygrib.open instance),
         # which behaves as an iterator over the GRIB messages in the file.
         for grb in grbs:
             if grb.shortName not in vars:
                 vars[grb.shortName] = grb.name
+                if expected is not None and grb.shortName in expected:
+                    n_missing -= 1
+
+            if n_missing == 0:
+                break
 
     return vars
 
@@ -83,10 +271,11 @@ def grib2nc(grib_file: Path, verbose: bool = False) -> Path:
     '''
     Extract the supported HRRR surface fields from GRIB2 and write netCDF.
 
-    The GRIB messages are selected with ``pygrib.open.select`` using numerical
+    The GRIB messages are selected in a single pass over the file using numerical
     GRIB2 parameter identifiers, level type, and level. In particular, U10 and
     V10 are selected directly at 10 m rather than by relying on the ordering of
-    a combined height dimension.
+    a combined height dimension. The wind speed WS10 is computed from U10 and
+    V10 and written in the same pass.
 
     Parameters
     ----------
@@ -124,60 +313,7 @@ def grib2nc(grib_file: Path, verbose: bool = False) -> Path:
             pygrib.open(str(grib_file)) as grbs,
             Dataset(temporary_output_file, mode='w', format='NETCDF4') as nc,
         ):
-            nc.setncatts(
-                {
-                    'model': 'HRRR',
-                    'processed_with': 'https://github.com/jankazil/hrrr-data',
-                }
-            )
-
-            reference_shape = None
-
-            for variable, field in _SFC_GRIB_FIELDS.items():
-                grb = _select_one_grib_message(grbs, variable, field['selector'])
-                shape = (grb.Ny, grb.Nx)
-
-                if reference_shape is None:
-                    reference_shape = shape
-                    nc.createDimension('ygrid_0', shape[0])
-                    nc.createDimension('xgrid_0', shape[1])
-
-                    latitude, longitude = grb.latlons()
-
-                    latitude_out = nc.createVariable(
-                        'gridlat_0', np.float32, ('ygrid_0', 'xgrid_0')
-                    )
-                    latitude_out.setncatts({'long_name': 'latitude', 'units': 'degrees_north'})
-                    latitude_out[:] = np.asarray(latitude, dtype=np.float32)
-                    del latitude, latitude_out
-
-                    longitude_out = nc.createVariable(
-                        'gridlon_0', np.float32, ('ygrid_0', 'xgrid_0')
-                    )
-                    longitude_out.setncatts({'long_name': 'longitude', 'units': 'degrees_east'})
-                    longitude_out[:] = np.asarray(longitude, dtype=np.float32)
-                    del longitude, longitude_out
-                elif shape != reference_shape:
-                    raise ValueError(
-                        f'GRIB message {variable!r} has shape {shape}, expected {reference_shape}'
-                    )
-
-                variable_out = nc.createVariable(
-                    variable,
-                    np.float32,
-                    ('ygrid_0', 'xgrid_0'),
-                    fill_value=np.float32(9.96921e36),
-                )
-                attrs = _grib_message_attrs(grb, field['long_name'])
-                attrs['coordinates'] = 'gridlat_0 gridlon_0'
-                variable_out.setncatts(attrs)
-
-                values = np.ma.asarray(grb.values, dtype=np.float32)
-                variable_out[:] = values
-                del values, variable_out
-
-                if verbose:
-                    print('selected:', variable, grb, flush=True)
+            _write_sfc_fields(grbs, nc, verbose=verbose)
 
         temporary_output_file.replace(output_file)
     finally:
@@ -185,7 +321,7 @@ def grib2nc(grib_file: Path, verbose: bool = False) -> Path:
             temporary_output_file.unlink()
 
     if verbose:
-        print('created:', output_file, flush=True)
+        print(f'created: {output_file}', flush=True)
 
     return output_file
 
@@ -196,6 +332,8 @@ def nc2nc_extract_vars(
     variables: list[str],
     long_names: list[str | None] | None = None,
     global_attributes: dict[str, str | None] | None = None,
+    scale_factors: dict[str, float] | None = None,
+    keepbits: dict[str, int] | None = None,
 ):
     '''
     Extracts given variables from a file in netCDF format and saves them in a file in netCDF format.
@@ -216,45 +354,87 @@ def nc2nc_extract_vars(
             Global attributes to set in the output dataset. Keys are attribute names and
             values are attribute values. A value of None leaves that attribute unchanged.
             Defaults to None.
+        scale_factors (dict[str, float], optional):
+            Variables to be stored packed as 16-bit integers, which halves their size, and the
+            precision (scale factor) with which they are stored, for example 0.01 for a
+            relative humidity in %. The values of a variable must lie within
+            ±32766 * scale factor. xarray and netCDF4 unpack the values when reading.
+            Defaults to None (no packing).
+        keepbits (dict[str, int], optional):
+            Variables to be stored as float32 rounded to the given number of mantissa bits
+            (see _bitround), between 0 and 22, for example 10 for a temperature (about
+            three significant digits). The zeroed bits let the variables compress several times better.
+            Defaults to None (no rounding).
     '''
 
+    out_file = Path(out_file)
+    temporary_out_file = out_file.with_name(out_file.name + '.tmp')
+
     # Open the file
 
-    with xr.open_dataset(in_file) as ds:
-        # Check for missing variables
-        missing_vars = [var for var in variables if var not in ds.variables]
-        if missing_vars:
-            warnings.warn(
-                f'The following variables are not present in the input file {in_file}: {missing_vars}',
-                category=UserWarning,
-                stacklevel=2,
-            )
+    try:
+        with xr.open_dataset(in_file) as ds:
+            # Check for missing variables
+            known_vars = frozenset(ds.variables)
+            missing_vars = [var for var in variables if var not in known_vars]
+            if missing_vars:
+                warnings.warn(
+                    f'The following variables are not present in the input file {in_file}: {missing_vars}',
+                    category=UserWarning,
+                    stacklevel=2,
+                )
+
+            # Variables available in the file
+            variables = [v for v in variables if v in known_vars]
+
+            # Select the requested variables:
+            ds_subset = ds[variables]
+
+            # Set the long names of the requested variables
+
+            if long_names is not None:
+                for variable, long_name in zip(variables, long_names, strict=False):
+                    if long_name is not None:
+                        ds_subset[variable].attrs['long_name'] = long_name
 
-        # Variables available in the file
-        variables = [v for v in variables if v not in missing_vars]
+            # Set the requested global attributes
 
-        # Select the requested variables:
-        ds_subset = ds[variables]
+            if global_attributes is not None:
+                for global_attribute in global_attributes:
+                    if global_attributes[global_attribute] is not None:
+                        ds_subset.attrs[global_attribute] = global_attributes[global_attribute]
 
-        # Set the long names of the requested variables
+            if keepbits is not None:
+                for variable, nbits in keepbits.items():
+                    if variable in variables:
+                        rounded = ds_subset[variable].astype(np.float32)
+                        rounded = rounded.copy(data=_bitround(rounded.values, nbits))
+                        rounded.encoding = _without_packing(ds_subset[variable].encoding)
+                        ds_subset[variable] = rounded
 
-        if long_names is not None:
-            for variable, long_name in zip(variables, long_names, strict=False):
-                if long_name is not None:
-                    ds_subset[variable].attrs['long_name'] = long_name
+            encoding = _nc_encoding(ds_subset)
 
-        # Set the requested global attributes
+            if scale_factors is not None:
+                for variable, scale_factor in scale_factors.items():
+                    if variable in variables:
+                        encoding.setdefault(variable, {}).update(
+                            dtype='int16',
+                            scale_factor=scale_factor,
+                            add_offset=0.0,
+                            _FillValue=-32767,
+                        )
 
-        if global_attributes is not None:
-            for global_attribute in global_attributes:
-                if global_attributes[global_attribute] is not None:
-                    ds_subset.attrs[global_attribute] = global_attributes[global_attribute]
+            # Write to a temporary file, which then replaces the output netCDF file, so that
+            # the output file is never left partially written
+            ds_subset.to_netcdf(temporary_out_file, mode='w', format='NETCDF4', encoding=encoding)
 
-        # Write to output netCDF file, overwrite if it exists
-        ds_subset.to_netcdf(out_file, mode='w')
+        temporary_out_file.replace(out_file)
+    finally:
+        if temporary_out_file.exists():
+            temporary_out_file.unlink()
 
 
-def nc2nc_process_wind_speed(nc_file: Path):
+def nc2nc_process_wind_speed(nc_file: Path, keepbits: int | None = None):
     '''
     If the given file in netCDF format contains the variables
 
@@ -271,102 +451,103 @@ def nc2nc_process_wind_speed(nc_file: Path):
     ---------
         nc_file (Path):
             File in netCDF format.
+        keepbits (int, optional):
+            If given, the created wind speed variables are stored as float32 and rounded to
+            this number of mantissa bits (see _bitround), between 0 and 22, which lets them compress better.
+            Defaults to None (no rounding).
     '''
 
     # Wind speed variables
 
-    u_var = 'UGRD_P0_L103_GLC0'
-    v_var = 'VGRD_P0_L103_GLC0'
-
-    variables = [u_var, v_var]
+    u_var, v_var = _WIND_VARS
 
     # Altitude dimension of wind speed variables
 
     alt_dim = 'lv_HTGL2'
 
-    # Open the file
-
-    with xr.open_dataset(nc_file) as ds_:
-        ds = ds_.load()  # Load all data from disk into memory
-
-        ds_.close()
-
-    # Check if wind speed variables are missing
-
-    missing_vars = [var for var in variables if var not in ds.variables]
-
-    if missing_vars:
-        # Do nothing and return.
-        return
+    # The dataset is read lazily, so that only the data that are written are read from disk,
+    # and the first altitude of the wind speed variables rather than all of them. Since the
+    # input file is read while the output is written, the output is written to a temporary file,
+    # which then replaces the input file.
 
-    #
-    # Create individual (U,V) wind speed variables for each altitude at which wind speed is given
-    #
+    temporary_nc_file = nc_file.with_name(nc_file.name + '.tmp')
 
-    wind_var_names = ['U', 'V']
-    wind_var_long_names = ['West-east wind speed', 'South-north wind speed']
-    wind_vars = [ds[u_var], ds[v_var]]
-
-    attrs_to_copy = [
-        'initial_time',
-        'forecast_time_units',
-        'forecast_time',
-        'level_type',
-        'parameter_template_discipline_category_number',
-        'parameter_discipline_and_category',
-        'grid_type',
-        'units',
-        'production_status',
-        'center',
-    ]
-
-    if all(alt_dim in wind_var.dims for wind_var in wind_vars):
-        seen_names = set()
-
-        for alt_i in range(1):
-            alt_value = ds[alt_dim][alt_i].item()
-            alt_string_int = str(int(np.round(alt_value)))
-            alt_string_float = str(np.round(alt_value, 3))
-
-            for wind_var_name, wind_var_long_name, wind_var in zip(
-                wind_var_names, wind_var_long_names, wind_vars, strict=True
-            ):
-                new_var_name = wind_var_name + alt_string_int
-
-                if new_var_name in seen_names or new_var_name in ds:
-                    raise ValueError(f'Duplicate output variable name: {new_var_name}')
-
-                seen_names.add(new_var_name)
-
-                ds[new_var_name] = wind_var.isel({alt_dim: alt_i})
-
-                for attr_name in attrs_to_copy:
-                    ds[new_var_name].attrs[attr_name] = wind_var.attrs[attr_name]
-
-                ds[new_var_name].attrs['long_name'] = (
-                    wind_var_long_name
-                    + ' at '
-                    + alt_string_float
-                    + ' '
-                    + ds[alt_dim].attrs['units']
-                )
-
-    else:
-        for wind_var_name, wind_var_long_name, wind_var in zip(
-            wind_var_names, wind_var_long_names, wind_vars, strict=True
-        ):
-            ds[wind_var_name] = wind_var
+    try:
+        with xr.open_dataset(nc_file) as ds:
+            # Check if wind speed variables are missing
+
+            missing_vars = [var for var in _WIND_VARS if var not in ds.variables]
+
+            if missing_vars:
+                # Do nothing and return.
+                return
+
+            #
+            # Create individual (U,V) wind speed variables for each altitude at which wind speed
+            # is given
+            #
+
+            wind_vars = (ds[u_var], ds[v_var])
+
+            # Created wind speed variables, added to the dataset in one assignment
+            new_vars = {}
+
+            # Attributes copied from each wind speed variable to the variables created from it
+            copied_attrs = [
+                {attr_name: wind_var.attrs[attr_name] for attr_name in _WIND_ATTRS_TO_COPY}
+                for wind_var in wind_vars
+            ]
+
+            if all(alt_dim in wind_var.dims for wind_var in wind_vars):
+                alt_values = np.asarray(ds[alt_dim].values)
+                alt_ints = np.rint(alt_values).astype(int)
+                alt_floats = np.round(alt_values, 3)
+                alt_units = ds[alt_dim].attrs['units']
+
+                for alt_i in range(1):
+                    alt_string_int = str(alt_ints[alt_i])
+                    alt_string_float = str(alt_floats[alt_i])
+
+                    for wind_var_name, wind_var_long_name, wind_var, attrs in zip(
+                        _WIND_VAR_NAMES, _WIND_VAR_LONG_NAMES, wind_vars, copied_attrs, strict=True
+                    ):
+                        new_var_name = wind_var_name + alt_string_int
+
+                        if new_var_name in new_vars or new_var_name in ds:
+                            raise ValueError(f'Duplicate output variable name: {new_var_name}')
+
+                        new_vars[new_var_name] = wind_var.isel({alt_dim: alt_i}).assign_attrs(
+                            attrs,
+                            long_name=f'{wind_var_long_name} at {alt_string_float} {alt_units}',
+                        )
+
+            else:
+                for wind_var_name, wind_var_long_name, wind_var, attrs in zip(
+                    _WIND_VAR_NAMES, _WIND_VAR_LONG_NAMES, wind_vars, copied_attrs, strict=True
+                ):
+                    new_vars[wind_var_name] = wind_var.assign_attrs(
+                        attrs, long_name=wind_var_long_name
+                    )
 
-            for attr_name in attrs_to_copy:
-                ds[wind_var_name].attrs[attr_name] = wind_var.attrs[attr_name]
+            if keepbits is not None:
+                for new_var_name, new_var in new_vars.items():
+                    new_var = new_var.astype(np.float32)
+                    new_var = new_var.copy(data=_bitround(new_var.values, keepbits))
+                    new_var.encoding = _without_packing(new_var.encoding)
+                    new_vars[new_var_name] = new_var
 
-            ds[wind_var_name].attrs['long_name'] = wind_var_long_name
+            # Replace the original wind speed variables by the created ones, in place
+            for wind_var_name in _WIND_VARS:
+                del ds[wind_var_name]
+            ds.update(new_vars)
 
-    # Remove original wind speed variables
-    ds = ds.drop_vars(variables)
+            # Write to output netCDF file, overwrite if it exists
+            ds.to_netcdf(temporary_nc_file, mode='w', format='NETCDF4', encoding=_nc_encoding(ds))
 
-    # Write to output netCDF file, overwrite if it exists
-    ds.to_netcdf(nc_file)
+        temporary_nc_file.replace(nc_file)
+    finally:
+        if temporary_nc_file.exists():
+            temporary_nc_file.unlink()
 
     return
 
@@ -377,8 +558,8 @@ def extract_select_sfc_vars_to_netcdf(
     '''
     Convert a GRIB file to a netCDF file containing only selected surface meteorological variables.
 
-    This function first checks whether a processed netCDF file already exists for the given GRIB input.
-    If not, or if reprocessing is requested, it converts the GRIB file to netCDF format, extracts key
+    This function first checks whether an up-to-date processed netCDF file already exists for the given
+    GRIB input. If not, or if reprocessing is requested, it converts the GRIB file to netCDF format, extracts key
     near-surface variables such as temperature, dew point, wind components, adds descriptive metadata,
     computes derived wind speed fields, and writes the results to a new netCDF file in the same directory.
 
@@ -388,6 +569,7 @@ def extract_select_sfc_vars_to_netcdf(
         Path to the input GRIB file containing HRRR model output.
     refresh : bool, optional
         If True, convert the GRIB file and extract variables even if a corresponding netCDF file already exists.
+        If False, an existing netCDF file is only replaced if it is empty or older than the GRIB file.
         Default is True.
     verbose : bool, optional
         If True, print progress messages during processing. Default is False.
@@ -401,14 +583,11 @@ def extract_select_sfc_vars_to_netcdf(
     # netCDF file to be created
     ncfile = grib_file.with_suffix('.nc')
 
-    if refresh or not ncfile.exists():
+    if refresh or not _is_up_to_date(ncfile, grib_file):
         if verbose:
-            print(flush=True)
             print(
-                'Converting and extracting selected surface variables from',
-                grib_file,
-                '->',
-                ncfile,
+                '\nConverting and extracting selected surface variables from '
+                f'{grib_file} -> {ncfile}',
                 flush=True,
             )
 
@@ -416,34 +595,546 @@ def extract_select_sfc_vars_to_netcdf(
 
     else:
         if verbose:
-            print(flush=True)
             print(
-                'Conversion',
-                grib_file,
-                '->',
-                ncfile,
-                'skipped - file exists and refresh =',
-                refresh,
+                f'\nConversion {grib_file} -> {ncfile} skipped - '
+                f'file is up to date and refresh = {refresh}',
                 flush=True,
             )
 
     return ncfile
 
 
-def _select_one_grib_message(grbs, variable: str, selector: dict[str, object]):
-    '''Select exactly one GRIB message using the supplied ecCodes keys.'''
+def combine_netcdf(nc_files: Iterable[Path], out_file: Path, verbose: bool = False) -> Path:
+    '''
+    Combine netCDF files created by grib2nc into a single netCDF file with a time dimension.
+
+    Each input file holds the fields of one forecast. The fields are concatenated along a new
+    dimension ``time`` (the forecast valid time), ordered by time, with the coordinate
+    ``forecast_reference_time`` giving the forecast initialization time. Reading a time
+    series from the combined file requires opening one file instead of one file per forecast,
+    and reads only a few chunks, which span up to 24 times along the time dimension.
+
+    The combined file is created with the variables of the earliest forecast, and the fields
+    of the forecasts are then copied into it one variable and one chunk along the time
+    dimension (up to 24 forecasts) at a time. At most one variable of 24 forecasts (about
+    180 MB on the HRRR CONUS grid) is therefore held in memory, whatever the number of files.
+    The values are copied as stored, with their data type and fill value.
+
+    The combined file is written to a temporary file, which then replaces the output file.
+
+    Parameters
+    ----------
+    nc_files : Iterable[Path]
+        netCDF files created by grib2nc (or extract_select_sfc_vars_to_netcdf), all on the
+        same horizontal grid and with the same variables.
+    out_file : Path
+        Combined netCDF file. If the file exists, it will be overwritten.
+    verbose : bool, optional
+        If True, print the name of the combined file. Defaults to False.
+
+    Returns
+    -------
+    Path
+        Path to the combined netCDF file.
+
+    Raises
+    ------
+    ValueError
+        If no input files are given.
+    '''
+    out_file = out_file.expanduser().resolve()
+    temporary_out_file = out_file.with_name(out_file.name + '.tmp')
+
+    forecasts = _sorted_forecasts(nc_files)
+
     try:
-        messages = grbs.select(**selector)
-    except ValueError:
-        messages = []
-
-    if len(messages) != 1:
-        raise ValueError(
-            f'Expected one GRIB message for {variable!r}, found {len(messages)}; '
-            f'selector: {selector}'
+        with Dataset(temporary_out_file, mode='w', format='NETCDF4') as out:
+            # Every value of every variable is written below
+            out.set_fill_off()
+
+            with Dataset(forecasts[0][0]) as nc:
+                time_variables = _create_combined_variables(nc, out, forecasts)
+
+            out.set_auto_maskandscale(False)
+
+            # The fields are written one chunk along the time dimension at a time, since
+            # writing a part of a compressed chunk reads and compresses the whole chunk again
+
+            for start in range(0, len(forecasts), _NC_TIME_CHUNK_SIZE):
+                block = [forecast[0] for forecast in forecasts[start : start + _NC_TIME_CHUNK_SIZE]]
+                for name in time_variables:
+                    out[name][start : start + len(block)] = _read_variable(block, name)
+
+        temporary_out_file.replace(out_file)
+    finally:
+        if temporary_out_file.exists():
+            temporary_out_file.unlink()
+
+    if verbose:
+        print(f'created: {out_file}', flush=True)
+
+    return out_file
+
+
+def combine_to_zarr(nc_files: Iterable[Path], out_store: Path, verbose: bool = False) -> Path:
+    '''
+    Combine netCDF files created by grib2nc into a single Zarr store with a time dimension.
+
+    Same as combine_netcdf, but the combined fields are written to a Zarr store, in which
+    every chunk is a separate compressed object. Reading a subset of the fields (e.g. a
+    region, or a time series at a grid point) reads only the chunks that intersect it, and
+    chunks can be read in parallel. The chunks span up to _NC_TIME_CHUNK_SIZE times and
+    _NC_CHUNK_SIZE values along each horizontal grid dimension.
+
+    The store is created with the coordinates of the earliest forecast, and the fields of the
+    forecasts are then written into it one variable and one chunk along the time dimension
+    at a time, as in combine_netcdf, so that the memory use does not grow with the number of
+    files.
+
+    Requires the optional dependency zarr.
+
+    Parameters
+    ----------
+    nc_files : Iterable[Path]
+        netCDF files created by grib2nc (or extract_select_sfc_vars_to_netcdf), all on the
+        same horizontal grid.
+    out_store : Path
+        Directory of the Zarr store. If it exists, it will be overwritten.
+    verbose : bool, optional
+        If True, print the name of the Zarr store. Defaults to False.
+
+    Returns
+    -------
+    Path
+        Path to the Zarr store.
+
+    Raises
+    ------
+    ValueError
+        If no input files are given.
+    '''
+    out_store = out_store.expanduser().resolve()
+
+    forecasts = _sorted_forecasts(nc_files)
+    n_times = len(forecasts)
+
+    # Create the store with the coordinates, and with data variables that hold only fill
+    # values, which are not stored in chunks
+
+    with xr.open_dataset(forecasts[0][0]) as ds:
+        ds_store = ds[['gridlat_0', 'gridlon_0']].load()
+
+        ds_store = ds_store.assign_coords(
+            time=[forecast[1] for forecast in forecasts],
+            forecast_reference_time=('time', [forecast[2] for forecast in forecasts]),
+        )
+
+        for name, variable in ds.data_vars.items():
+            # The forecast times of the individual files are given by the time coordinates
+            attrs = {
+                key: value
+                for key, value in variable.attrs.items()
+                if key not in ('initial_time', 'forecast_time', 'forecast_time_units')
+            }
+            fill_value = np.array(np.nan, dtype=variable.dtype)
+            ds_store[name] = (
+                ('time', *variable.dims),
+                np.broadcast_to(fill_value, (n_times, *variable.shape)),
+                attrs,
+            )
+            ds_store[name].encoding = {
+                key: value
+                for key, value in variable.encoding.items()
+                if key in ('_FillValue', 'dtype')
+            }
+
+    ny, nx = ds_store['gridlat_0'].shape
+    chunks_2d = (min(ny, _NC_CHUNK_SIZE), min(nx, _NC_CHUNK_SIZE))
+    chunks_3d = (min(n_times, _NC_TIME_CHUNK_SIZE), *chunks_2d)
+
+    encoding = {name: {'chunks': chunks_2d} for name in ('gridlat_0', 'gridlon_0')}
+    for name in ds_store.data_vars:
+        encoding[name] = {'chunks': chunks_3d}
+
+    # The netCDF encoding of the input files does not apply to Zarr
+    for name in ('gridlat_0', 'gridlon_0'):
+        ds_store[name].encoding = {}
+
+    ds_store.to_zarr(out_store, mode='w', encoding=encoding, consolidated=True)
+
+    # Write the fields one variable and one chunk along the time dimension at a time, so that
+    # every chunk is written once
+
+    for start in range(0, n_times, _NC_TIME_CHUNK_SIZE):
+        block = [forecast[0] for forecast in forecasts[start : start + _NC_TIME_CHUNK_SIZE]]
+        for name in ds_store.data_vars:
+            values = np.empty((len(block), ny, nx), dtype=ds_store[name].dtype)
+            for i, nc_file in enumerate(block):
+                with xr.open_dataset(nc_file) as ds:
+                    values[i] = ds[name].values
+            xr.Dataset({name: (ds_store[name].dims, values)}).to_zarr(
+                out_store, region={'time': slice(start, start + len(block))}
+            )
+
+    if verbose:
+        print(f'created: {out_store}', flush=True)
+
+    return out_store
+
+
+def _sorted_forecasts(nc_files: Iterable[Path]) -> list[tuple[Path, datetime, datetime]]:
+    '''
+    Return the netCDF files of individual forecasts with the valid time and the
+    initialization time of their forecast, ordered by valid time.
+
+    Raises ValueError if no files are given.
+    '''
+    forecasts = []
+
+    for nc_file in nc_files:
+        with Dataset(nc_file) as nc:
+            variable = nc[next(iter(_SFC_GRIB_FIELDS))]
+            reference_time = datetime.strptime(variable.initial_time, '%m/%d/%Y (%H:%M)')
+            valid_time = reference_time + timedelta(hours=int(variable.forecast_time))
+        forecasts.append((Path(nc_file), valid_time, reference_time))
+
+    if not forecasts:
+        raise ValueError('No netCDF files to combine')
+
+    return sorted(forecasts, key=lambda forecast: forecast[1])
+
+
+def _read_variable(nc_files: list[Path], name: str) -> np.ndarray:
+    '''
+    Read a variable from netCDF files into one array, with the files along the first
+    dimension. The values are read as stored, without masking or unpacking.
+    '''
+    values = None
+
+    for i, nc_file in enumerate(nc_files):
+        with Dataset(nc_file) as nc:
+            variable = nc[name]
+            variable.set_auto_maskandscale(False)
+            if values is None:
+                values = np.empty((len(nc_files), *variable.shape), dtype=variable.dtype)
+            values[i] = variable[...]
+
+    return values
+
+
+def _create_combined_variables(
+    nc: Dataset, out: Dataset, forecasts: list[tuple[Path, datetime, datetime]]
+) -> list[str]:
+    '''
+    Create the dimensions and variables of the file written by combine_netcdf, with the
+    variables of the netCDF file of one forecast, and write the time coordinates and the
+    latitudes and longitudes.
+
+    Returns the names of the variables that have the time dimension, into which the fields of
+    the forecasts are to be copied.
+    '''
+    n_times = len(forecasts)
+
+    out.setncatts(nc.__dict__)
+
+    out.createDimension('time', n_times)
+    for name, dimension in nc.dimensions.items():
+        out.createDimension(name, len(dimension))
+
+    # Time coordinates
+
+    for name, times in (
+        ('time', [forecast[1] for forecast in forecasts]),
+        ('forecast_reference_time', [forecast[2] for forecast in forecasts]),
+    ):
+        units = f'hours since {min(times):%Y-%m-%d %H:%M:%S}'
+        values = date2num(times, units, calendar='proleptic_gregorian')
+        variable = out.createVariable(name, values.dtype, ('time',))
+        variable.setncatts({'units': units, 'calendar': 'proleptic_gregorian'})
+        variable[:] = values
+
+    # Latitudes and longitudes, and the fields with the time dimension. The forecast times of
+    # the individual files are given by the time coordinates.
+
+    time_variables = []
+
+    for name, variable in nc.variables.items():
+        attrs = {
+            key: variable.getncattr(key)
+            for key in variable.ncattrs()
+            if key not in ('_FillValue', 'initial_time', 'forecast_time', 'forecast_time_units')
+        }
+
+        if name in ('gridlat_0', 'gridlon_0'):
+            dimensions = variable.dimensions
+        else:
+            dimensions = ('time', *variable.dimensions)
+            attrs['coordinates'] = ' '.join(
+                ('forecast_reference_time', *attrs.get('coordinates', '').split())
+            )
+            time_variables.append(name)
+
+        chunksizes = tuple(
+            min(len(out.dimensions[dimension]), _NC_TIME_CHUNK_SIZE)
+            if dimension == 'time'
+            else min(len(out.dimensions[dimension]), _NC_CHUNK_SIZE)
+            for dimension in dimensions
+        )
+
+        out_variable = out.createVariable(
+            name,
+            variable.dtype,
+            dimensions,
+            fill_value=getattr(variable, '_FillValue', None),
+            chunksizes=chunksizes,
+            **_NC_COMPRESSION,
         )
+        out_variable.setncatts(attrs)
+
+        if name in ('gridlat_0', 'gridlon_0'):
+            variable.set_auto_maskandscale(False)
+            out_variable.set_auto_maskandscale(False)
+            out_variable[...] = variable[...]
+
+    return time_variables
+
+
+def _write_sfc_fields(grbs, nc: Dataset, verbose: bool = False) -> None:
+    '''
+    Write the supported HRRR surface fields from an open GRIB file to an open netCDF dataset.
+
+    Parameters
+    ----------
+    grbs : pygrib.open
+        Open GRIB file.
+    nc : netCDF4.Dataset
+        netCDF dataset open for writing.
+    verbose : bool, optional
+        If True, print the selected GRIB messages. Defaults to False.
+    '''
+    # Every value of every variable is written below, so prefilling the variables with the fill
+    # value would only write them twice
+    nc.set_fill_off()
+
+    nc.setncatts(_NC_GLOBAL_ATTRS)
+
+    messages = _select_grib_messages(grbs, _SFC_GRIB_FIELDS)
+
+    # Define all dimensions, variables and attributes before writing any data, so that the
+    # file metadata is complete when the data are written
+
+    shapes = {variable: (grb.Ny, grb.Nx) for variable, grb in messages.items()}
+    reference_variable = next(iter(shapes))
+    reference_shape = shapes[reference_variable]
+
+    for variable, shape in shapes.items():
+        if shape != reference_shape:
+            raise ValueError(
+                f'GRIB message {variable!r} has shape {shape}, expected {reference_shape}'
+            )
+
+    nc.createDimension('ygrid_0', reference_shape[0])
+    nc.createDimension('xgrid_0', reference_shape[1])
+
+    chunksizes = tuple(min(n, _NC_CHUNK_SIZE) for n in reference_shape)
+
+    latitude_out = nc.createVariable(
+        'gridlat_0', np.float32, ('ygrid_0', 'xgrid_0'), chunksizes=chunksizes, **_NC_COMPRESSION
+    )
+    latitude_out.setncatts(_NC_LATITUDE_ATTRS)
+
+    longitude_out = nc.createVariable(
+        'gridlon_0', np.float32, ('ygrid_0', 'xgrid_0'), chunksizes=chunksizes, **_NC_COMPRESSION
+    )
+    longitude_out.setncatts(_NC_LONGITUDE_ATTRS)
+
+    variables_out = {}
+
+    for variable, field in _SFC_GRIB_FIELDS.items():
+        attrs = _grib_message_attrs(messages[variable], field['long_name'])
+        variables_out[variable] = _create_sfc_variable(
+            nc, variable, attrs, chunksizes, _NC_COMPRESSION
+        )
+
+    wind_speed_attrs = _grib_message_attrs(
+        messages[_SFC_WIND_SPEED_COMPONENTS[0]], _SFC_WIND_SPEED_LONG_NAME
+    )
+    wind_speed_attrs['parameter_template_discipline_category_number'][3] = (
+        _SFC_WIND_SPEED_PARAMETER_NUMBER
+    )
+    wind_speed_out = _create_sfc_variable(
+        nc, _SFC_WIND_SPEED_VAR, wind_speed_attrs, chunksizes, _NC_COMPRESSION
+    )
+
+    # Write the data, each variable in a single assignment
+
+    latitude, longitude = messages[reference_variable].latlons()
+    latitude_out[:] = np.asarray(latitude, dtype=np.float32)
+    longitude_out[:] = np.asarray(longitude, dtype=np.float32)
+    del latitude, longitude
+
+    wind_components = {}
+
+    for variable, variable_out in variables_out.items():
+        grb = messages[variable]
+        values = np.ma.asarray(grb.values, dtype=np.float32)
+        variable_out[:] = values
+
+        if variable in _SFC_WIND_SPEED_COMPONENTS:
+            wind_components[variable] = values
+
+        if verbose:
+            print(f'selected: {variable} {grb}', flush=True)
+
+    wind_speed_out[:] = _hypot(*(wind_components[c] for c in _SFC_WIND_SPEED_COMPONENTS))
+
+
+def _hypot(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    '''
+    Return sqrt(u**2 + v**2) element-wise, as np.ma.hypot, for arrays of the same shape.
+
+    Arrays of at least _PARALLEL_MIN_SIZE values are computed in blocks of rows, one per CPU,
+    in a pool of threads. Masked input values are masked in the result.
+    '''
+    mask = np.ma.mask_or(np.ma.getmask(u), np.ma.getmask(v))
+    u = np.ma.getdata(u)
+    v = np.ma.getdata(v)
+
+    n_threads = min(os.cpu_count() or 1, len(u)) if u.ndim else 1
+
+    if u.size < _PARALLEL_MIN_SIZE or n_threads < 2:
+        out = np.hypot(u, v)
+    else:
+        out = np.empty(u.shape, dtype=np.result_type(u, v))
+        bounds = np.linspace(0, len(u), n_threads + 1, dtype=int)
+
+        def hypot_rows(start: int, stop: int) -> None:
+            np.hypot(u[start:stop], v[start:stop], out=out[start:stop])
+
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            # Consume the results to raise any exception
+            list(executor.map(hypot_rows, bounds[:-1], bounds[1:]))
+
+    return np.ma.array(out, mask=mask)
+
+
+def _create_sfc_variable(
+    nc: Dataset, variable: str, attrs: dict, chunksizes: tuple[int, ...], compression: dict
+):
+    '''Create a float32 variable on the horizontal grid with the given attributes.'''
+    variable_out = nc.createVariable(
+        variable,
+        np.float32,
+        ('ygrid_0', 'xgrid_0'),
+        fill_value=np.float32(9.96921e36),
+        chunksizes=chunksizes,
+        **compression,
+    )
+    attrs['coordinates'] = 'gridlat_0 gridlon_0'
+    variable_out.setncatts(attrs)
+    return variable_out
+
+
+def _is_up_to_date(out_file: Path, in_file: Path) -> bool:
+    '''
+    Return True if a file created from another file exists, is not empty, and is not older than
+    the other file.
+    '''
+    try:
+        out_stat = out_file.stat()
+        in_stat = in_file.stat()
+    except OSError:
+        return False
+
+    return out_stat.st_size > 0 and out_stat.st_mtime_ns >= in_stat.st_mtime_ns
+
+
+def _nc_encoding(ds: xr.Dataset) -> dict[str, dict]:
+    '''
+    Return the encoding of the variables of a dataset for writing it to a netCDF file.
+
+    The variables on the horizontal grid are compressed with the settings in _NC_COMPRESSION,
+    in chunks spanning up to _NC_CHUNK_SIZE values along the horizontal grid dimensions and one
+    value along any other dimension. The packing of the variables (dtype, scale_factor,
+    add_offset) and their fill values are kept from their encoding (see _NC_PACKING_KEYS).
+    '''
+    encoding = {}
+
+    for name, variable in ds.variables.items():
+        if not {'ygrid_0', 'xgrid_0'} <= set(variable.dims) or variable.dtype.kind not in 'fiu':
+            continue
+
+        chunksizes = tuple(
+            min(n, _NC_CHUNK_SIZE) if dim in ('ygrid_0', 'xgrid_0') else 1
+            for dim, n in zip(variable.dims, variable.shape, strict=True)
+        )
+        encoding[name] = {
+            **{key: variable.encoding[key] for key in _NC_PACKING_KEYS if key in variable.encoding},
+            'chunksizes': chunksizes,
+            **_NC_COMPRESSION,
+        }
+
+    return encoding
+
+
+def _without_packing(encoding: dict) -> dict:
+    '''Return an encoding without the keys with which a variable is stored packed.'''
+    return {key: value for key, value in encoding.items() if key not in _NC_PACKING_KEYS}
+
+
+def _bitround(values: np.ndarray, keepbits: int) -> np.ndarray:
+    '''
+    Round float32 values to the given number of mantissa bits, to the nearest value (ties to
+    even), and set the remaining mantissa bits to zero.
+
+    The values keep about keepbits * log10(2) significant decimal digits (keepbits = 10 keeps
+    about three), and the zeroed bits compress to almost nothing. NaNs and infinite values are
+    left unchanged.
+
+    Raises ValueError if keepbits is not between 0 and 22, the number of mantissa bits that can
+    be rounded away from float32 values.
+    '''
+    if not 0 <= keepbits < 23:
+        raise ValueError(f'keepbits must be between 0 and 22, got {keepbits}')
+
+    values = np.array(values, dtype=np.float32)
+
+    maskbits = 23 - keepbits
+    bits = values.view(np.uint32)
+    finite = np.isfinite(values)
+
+    half = np.uint32((1 << (maskbits - 1)) - 1)
+    mask = np.uint32(~((1 << maskbits) - 1) & 0xFFFFFFFF)
+
+    rounded = (bits + half + ((bits >> np.uint32(maskbits)) & np.uint32(1))) & mask
+    bits[finite] = rounded[finite]
+
+    return values
+
+
+def _select_grib_messages(grbs, fields: dict[str, dict]) -> dict[str, object]:
+    '''
+    Select exactly one GRIB message per field using the supplied ecCodes keys.
+
+    The messages are matched in a single pass over the file, instead of one
+    ``pygrib.open.select`` call (and hence one full scan of the file) per field.
+    '''
+    matches = {variable: [] for variable in fields}
+
+    grbs.seek(0)
+    for grb in grbs:
+        for variable, field in fields.items():
+            if all(getattr(grb, key, None) == value for key, value in field['selector'].items()):
+                matches[variable].append(grb)
+
+    for variable, messages in matches.items():
+        if len(messages) != 1:
+            raise ValueError(
+                f'Expected one GRIB message for {variable!r}, found {len(messages)}; '
+                f'selector: {fields[variable]["selector"]}'
+            )
 
-    return messages[0]
+    return {variable: messages[0] for variable, messages in matches.items()}
 
 
 def _grib_message_attrs(grb, long_name: str) -> dict[str, str | int | list[int]]:
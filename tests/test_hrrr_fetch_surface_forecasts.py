@@ -0,0 +1,78 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from hrrr_data import hrrr_fetch_surface_forecasts, s3, tools
+
+
+def test_run_fetch_returns_files_in_date_order(monkeypatch, tmp_path):
+    grib_files = [
+        tmp_path / f'hrrr.2020120{day}/conus/hrrr.t00z.wrfsfcf24.grib2' for day in (3, 1, 2)
+    ]
+
+    def extract(grib_file, refresh, verbose):
+        # The first file to be submitted completes last
+        time.sleep(0.1 if grib_file == grib_files[0] else 0)
+        return grib_file.with_suffix('.nc')
+
+    monkeypatch.setattr(s3, 'download_date_range_iter', lambda *args, **kwargs: iter(grib_files))
+    monkeypatch.setattr(tools, 'extract_select_sfc_vars_to_netcdf', extract)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        out_files = hrrr_fetch_surface_forecasts.run_fetch(
+            datetime(2020, 12, 1),
+            datetime(2020, 12, 3),
+            0,
+            24,
+            'conus',
+            tmp_path,
+            extract=True,
+            executor=executor,
+        )
+
+    assert out_files == sorted(Path(grib_file).with_suffix('.nc') for grib_file in grib_files)
+
+
+def test_batch_mode_reads_lines_with_overriding_options(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(
+        hrrr_fetch_surface_forecasts,
+        'run_fetch',
+        lambda *args, **kwargs: calls.append((args, kwargs)) or [],
+    )
+    monkeypatch.setattr(
+        'sys.stdin',
+        io.StringIO(
+            '# comment\n'
+            f'2020 12 1 2020 12 3 0 24 conus {tmp_path}\n'
+            '\n'
+            f'2021 1 1 2021 1 2 12 6 alaska "{tmp_path}/a b" -n 4 -r\n'
+        ),
+    )
+
+    assert hrrr_fetch_surface_forecasts.main(['-b', '-n', '2', '-v']) == 0
+
+    (args1, kwargs1), (args2, kwargs2) = calls
+    assert args1 == (datetime(2020, 12, 1), datetime(2020, 12, 3), 0, 24, 'conus', tmp_path)
+    assert args2 == (datetime(2021, 1, 1), datetime(2021, 1, 2), 12, 6, 'alaska', tmp_path / 'a b')
+    assert kwargs1['n_jobs'] == 2 and not kwargs1['refresh'] and kwargs1['verbose']
+    assert kwargs2['n_jobs'] == 4 and kwargs2['refresh'] and kwargs2['verbose']
+
+
+def test_missing_positional_argument_is_a_parser_error(monkeypatch, capsys):
+    monkeypatch.setattr(hrrr_fetch_surface_forecasts, 'run_fetch', lambda *args, **kwargs: [])
+
+    with pytest.raises(SystemExit) as exc_info:
+        hrrr_fetch_surface_forecasts.main(['2020', '12', '1', '2020', '12', '3', '0', '24'])
+    assert exc_info.value.code == 2
+    assert 'missing positional arguments: region, data_dir' in capsys.readouterr().err
+
+    monkeypatch.setattr('sys.stdin', io.StringIO('2020 12 1 2020 12 3 0 24 conus\n'))
+    with pytest.raises(SystemExit) as exc_info:
+        hrrr_fetch_surface_forecasts.main(['-b'])
+    assert exc_info.value.code == 2
+    assert 'missing positional arguments: data_dir' in capsys.readouterr().err
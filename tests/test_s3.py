@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import os
+
+import numpy as np
+import pytest
+from fsspec.asyn import get_loop
+
+from hrrr_data import s3
+
+KEYS = [
+    'hrrr.20250101/conus/hrrr.t00z.wrfsfcf01.grib2',
+    'hrrr.20250101/conus/hrrr.t00z.wrfsfcf02.grib2',
+    'hrrr.20250101/alaska/hrrr.t00z.wrfsfcf01.grib2',
+    'hrrr.20250102/conus/hrrr.t00z.wrfsfcf01.grib2',
+    'hrrr.20241231/conus/hrrr.t00z.wrfsfcf01.grib2',
+]
+
+
+class StubFS:
+    '''S3 file system with the keys KEYS in the HRRR bucket, which records its requests.'''
+
+    def __init__(self, keys=KEYS, page_size=2):
+        self.keys = sorted(keys)
+        self.page_size = page_size
+        self.requests = []
+
+    def call_s3(
+        self, method, Bucket, Prefix=None, Delimiter=None, ContinuationToken=None, Key=None
+    ):
+        assert Bucket == s3.BUCKET
+        if method == 'head_object':
+            self.requests.append(('head', Key))
+            if Key not in self.keys:
+                raise FileNotFoundError(Key)
+            return {'ContentLength': 1, 'ETag': '"e"'}
+        assert method == 'list_objects_v2' and Delimiter == '/'
+        self.requests.append(('list', Prefix))
+        entries = []
+        for key in self.keys:
+            if key.startswith(Prefix):
+                rest = key[len(Prefix) :]
+                if '/' in rest:
+                    entry = ('prefix', Prefix + rest.split('/', 1)[0] + '/')
+                else:
+                    entry = ('key', key)
+                if entry not in entries:
+                    entries.append(entry)
+        start = int(ContinuationToken or 0)
+        page = entries[start : start + self.page_size]
+        out = {
+            'CommonPrefixes': [{'Prefix': name} for kind, name in page if kind == 'prefix'],
+            'Contents': [
+                {'Key': name, 'Size': 1, 'ETag': '"e"', 'LastModified': 0}
+                for kind, name in page
+                if kind == 'key'
+            ],
+            'IsTruncated': start + self.page_size < len(entries),
+        }
+        if out['IsTruncated']:
+            out['NextContinuationToken'] = str(start + self.page_size)
+        return out
+
+    def ls(self, path, detail=True):
+        self.requests.append(('ls', path))
+        key = path[len(s3.BUCKET) + 1 :]
+        entries = s3._list_with_prefix(self, path, '')
+        self.requests.pop()
+        if not entries and key:
+            raise FileNotFoundError(path)
+        return entries
+
+    def exists(self, path):
+        raise AssertionError('exists must not be called')
+
+
+def test_glob_magic_segments():
+    fs = StubFS()
+    assert s3._glob(fs, 'hrrr.2025*/conus/*f01.grib2') == [
+        s3.BUCKET + '/hrrr.20250101/conus/hrrr.t00z.wrfsfcf01.grib2',
+        s3.BUCKET + '/hrrr.20250102/conus/hrrr.t00z.wrfsfcf01.grib2',
+    ]
+    # The literal part of the first segment is passed to S3 as the prefix
+    assert fs.requests[0] == ('list', 'hrrr.2025')
+
+
+def test_glob_literal_last_segment():
+    fs = StubFS()
+    assert s3._glob(fs, 'hrrr.2025010?/conus/hrrr.t00z.wrfsfcf02.grib2') == [
+        s3.BUCKET + '/hrrr.20250101/conus/hrrr.t00z.wrfsfcf02.grib2',
+    ]
+    # One listing per matching day, restricted to the last segment
+    assert fs.requests == [
+        ('list', 'hrrr.2025010'),
+        ('list', 'hrrr.20250101/conus/hrrr.t00z.wrfsfcf02.grib2'),
+        ('list', 'hrrr.20250102/conus/hrrr.t00z.wrfsfcf02.grib2'),
+    ]
+
+
+def test_glob_literal_last_segment_matches_whole_name():
+    fs = StubFS()
+    assert s3._glob(fs, 'hrrr.*/alask') == []
+    assert s3._glob(fs, 'hrrr.*/alaska') == [s3.BUCKET + '/hrrr.20250101/alaska']
+
+
+def test_glob_wildcard_without_literal_prefix():
+    fs = StubFS()
+    assert s3._glob(fs, 'hrrr.20250101/*') == [
+        s3.BUCKET + '/hrrr.20250101/alaska',
+        s3.BUCKET + '/hrrr.20250101/conus',
+    ]
+    assert s3._glob(fs, 'hrrr.20991231/*') == []
+
+
+def test_list_with_prefix_paginates():
+    fs = StubFS(page_size=1)
+    entries = s3._list_with_prefix(fs, s3.BUCKET + '/hrrr.20250101/conus', 'hrrr.t00z')
+    assert [entry['name'] for entry in entries] == [
+        s3.BUCKET + '/hrrr.20250101/conus/hrrr.t00z.wrfsfcf01.grib2',
+        s3.BUCKET + '/hrrr.20250101/conus/hrrr.t00z.wrfsfcf02.grib2',
+    ]
+    assert len(fs.requests) == 2
+
+
+def test_info_of_object_and_directory(monkeypatch):
+    fs = StubFS()
+    monkeypatch.setattr(s3, '_get_fs', lambda: fs)
+    s3.invalidate_info_cache()
+
+    file_info = s3.info('hrrr.20250101/conus/hrrr.t00z.wrfsfcf01.grib2')
+    assert file_info['type'] == 'file' and file_info['ETag'] == '"e"'
+    assert fs.requests == [('head', 'hrrr.20250101/conus/hrrr.t00z.wrfsfcf01.grib2')]
+
+    directory_info = s3.info('hrrr.20250101/conus')
+    assert directory_info['name'] == s3.BUCKET + '/hrrr.20250101/conus'
+    assert directory_info['type'] == 'directory'
+
+    with pytest.raises(FileNotFoundError):
+        s3.info('hrrr.20250101/con')
+
+    s3.invalidate_info_cache()
+
+
+class StubRangeFS:
+    '''S3 file system that serves byte ranges of data, the later ones first.'''
+
+    def __init__(self, data, fail_at=None):
+        self.loop = get_loop()
+        self.data = data
+        self.fail_at = fail_at
+
+    async def _cat_file(self, path, start=None, end=None):
+        await asyncio.sleep(0.001 * (len(self.data) - start) / len(self.data))
+        if start == self.fail_at:
+            raise OSError('request failed')
+        return self.data[start:end]
+
+
+@pytest.mark.parametrize('pwrite', [True, False])
+def test_get_multipart(monkeypatch, tmp_path, pwrite):
+    data = np.random.default_rng(0).bytes(10_000)
+    monkeypatch.setattr(s3, '_get_fs', lambda: StubRangeFS(data))
+    if not pwrite:
+        monkeypatch.delattr(os, 'pwrite')
+
+    local_file = tmp_path / 'x' / 'file.grib2'
+    checksum = s3._get_multipart('file.grib2', local_file, len(data), 999, 3, md5=True)
+
+    assert local_file.read_bytes() == data
+    assert checksum == hashlib.md5(data).hexdigest()
+    assert not local_file.with_name('file.grib2.part').exists()
+
+
+def test_get_multipart_failure_leaves_no_file(monkeypatch, tmp_path):
+    data = np.random.default_rng(0).bytes(10_000)
+    monkeypatch.setattr(s3, '_get_fs', lambda: StubRangeFS(data, fail_at=3 * 999))
+
+    local_file = tmp_path / 'file.grib2'
+    with pytest.raises(OSError):
+        s3._get_multipart('file.grib2', local_file, len(data), 999, 3)
+
+    assert not local_file.exists()
+    assert not local_file.with_name('file.grib2.part').exists()
+
+
+class StubGetFS:
+    '''S3 file system that downloads data with single GET requests, which it counts.'''
+
+    def __init__(self, data):
+        self.loop = get_loop()
+        self.data = data
+        self.gets = 0
+
+    async def _get_file(self, rpath, lpath):
+        self.gets += 1
+        with open(lpath, 'wb') as f:
+            f.write(self.data)
+
+
+def download(fs, tmp_path, ETag):
+    hrrr_file_info = {'ETag': f'"{ETag}"', 'size': len(fs.data)}
+    return s3.download('x/file.grib2', tmp_path, hrrr_file_info=hrrr_file_info)
+
+
+@pytest.fixture
+def stub_get_fs(monkeypatch):
+    fs = StubGetFS(np.random.default_rng(0).bytes(1000))
+    monkeypatch.setattr(s3, '_get_fs', lambda: fs)
+    return fs
+
+
+def test_multipart_etag_without_record_downloads_again(stub_get_fs, tmp_path):
+    # A file of the right size, e.g. left by an interrupted download into a preallocated file
+    local_file = tmp_path / 'x' / 'file.grib2'
+    local_file.parent.mkdir()
+    local_file.write_bytes(bytes(len(stub_get_fs.data)))
+
+    download(stub_get_fs, tmp_path, 'abc-2')
+
+    assert stub_get_fs.gets == 1
+    assert local_file.read_bytes() == stub_get_fs.data
+    assert local_file.with_name('file.grib2.etag').exists()
+
+
+def test_multipart_etag_with_record_skips_download(stub_get_fs, tmp_path):
+    local_file = download(stub_get_fs, tmp_path, 'abc-2')
+    assert stub_get_fs.gets == 1
+
+    download(stub_get_fs, tmp_path, 'abc-2')
+    assert stub_get_fs.gets == 1
+
+    # A record of another object, or of the file before it was modified, does not match
+    download(stub_get_fs, tmp_path, 'def-2')
+    assert stub_get_fs.gets == 2
+
+    os.utime(local_file, ns=(0, 0))
+    download(stub_get_fs, tmp_path, 'def-2')
+    assert stub_get_fs.gets == 3
+
+
+def test_single_part_etag_is_compared_with_md5(stub_get_fs, tmp_path):
+    ETag = hashlib.md5(stub_get_fs.data).hexdigest()
+    local_file = tmp_path / 'x' / 'file.grib2'
+    local_file.parent.mkdir()
+    local_file.write_bytes(stub_get_fs.data)
+
+    download(stub_get_fs, tmp_path, ETag)
+    assert stub_get_fs.gets == 0
+    assert s3._matches_etag(local_file, ETag, len(stub_get_fs.data))
+
+    local_file.write_bytes(bytes(len(stub_get_fs.data)))
+    download(stub_get_fs, tmp_path, ETag)
+    assert stub_get_fs.gets == 1
+
+
+def test_stale_part_file_is_not_used(stub_get_fs, tmp_path):
+    part_file = tmp_path / 'x' / 'file.grib2.part'
+    part_file.parent.mkdir()
+    part_file.write_bytes(bytes(len(stub_get_fs.data)))
+
+    local_file = download(stub_get_fs, tmp_path, 'abc-2')
+
+    assert stub_get_fs.gets == 1
+    assert local_file.read_bytes() == stub_get_fs.data
+    assert not part_file.exists()
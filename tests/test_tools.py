@@ -0,0 +1,284 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from hrrr_data import tools
+from hrrr_data.tools import _bitround
+
+FILL_VALUE = np.float32(9.96921e36)
+
+
+def write_forecast(nc_file, initial_time, forecast_time, seed):
+    '''Write a netCDF file with the variables and attributes of a file created by grib2nc.'''
+    rng = np.random.default_rng(seed)
+    lat, lon = np.meshgrid(np.linspace(20, 50, 7), np.linspace(-120, -70, 5))
+    attrs = {
+        'initial_time': initial_time,
+        'forecast_time': forecast_time,
+        'forecast_time_units': 'hours',
+        'units': 'K',
+    }
+    data_vars = {}
+    for name in ('TMP_P0_L103_GLC0', 'DPT_P0_L103_GLC0', 'U10', 'V10', 'WS10'):
+        values = rng.normal(280, 5, lat.shape).astype(np.float32)
+        values[0, 0] = np.nan
+        data_vars[name] = (('ygrid_0', 'xgrid_0'), values, attrs)
+    ds = xr.Dataset(
+        data_vars,
+        coords={
+            'gridlat_0': (('ygrid_0', 'xgrid_0'), lat.astype(np.float32)),
+            'gridlon_0': (('ygrid_0', 'xgrid_0'), lon.astype(np.float32)),
+        },
+        attrs={'model': 'HRRR'},
+    )
+    ds.to_netcdf(nc_file, encoding={name: {'_FillValue': FILL_VALUE} for name in data_vars})
+    return ds
+
+
+def write_forecasts(tmp_path):
+    '''Write files of forecasts that are not in the order of their valid time.'''
+    specs = [('12/03/2020 (00:00)', 24), ('12/01/2020 (00:00)', 24), ('12/02/2020 (12:00)', 6)]
+    nc_files, datasets = [], []
+    for i, (initial_time, forecast_time) in enumerate(specs):
+        nc_file = tmp_path / f'forecast{i}.nc'
+        datasets.append(write_forecast(nc_file, initial_time, forecast_time, i))
+        nc_files.append(nc_file)
+    return nc_files, datasets
+
+
+def check_combined(combined, datasets):
+    '''Check a combined dataset against the datasets of forecasts 1, 2, 0 (in time order).'''
+    assert list(combined['time'].values) == [
+        np.datetime64('2020-12-02T00:00'),
+        np.datetime64('2020-12-02T18:00'),
+        np.datetime64('2020-12-04T00:00'),
+    ]
+    assert list(combined['forecast_reference_time'].values) == [
+        np.datetime64('2020-12-01T00:00'),
+        np.datetime64('2020-12-02T12:00'),
+        np.datetime64('2020-12-03T00:00'),
+    ]
+    for i, j in enumerate((1, 2, 0)):
+        for name, variable in datasets[j].data_vars.items():
+            np.testing.assert_array_equal(combined[name][i].values, variable.values)
+    np.testing.assert_array_equal(combined['gridlat_0'].values, datasets[0]['gridlat_0'].values)
+    assert 'initial_time' not in combined['TMP_P0_L103_GLC0'].attrs
+
+
+def test_combine_netcdf(tmp_path):
+    nc_files, datasets = write_forecasts(tmp_path)
+    out_file = tools.combine_netcdf(nc_files, tmp_path / 'combined.nc')
+    with xr.open_dataset(out_file) as combined:
+        check_combined(combined, datasets)
+        encoding = combined['TMP_P0_L103_GLC0'].encoding
+        assert encoding['_FillValue'] == FILL_VALUE
+        assert encoding['zlib'] and encoding['chunksizes'] == (3, 5, 7)
+    assert not (tmp_path / 'combined.nc.tmp').exists()
+
+
+def test_combine_to_zarr(tmp_path):
+    pytest.importorskip('zarr')
+    nc_files, datasets = write_forecasts(tmp_path)
+    out_store = tools.combine_to_zarr(nc_files, tmp_path / 'combined.zarr')
+    with xr.open_zarr(out_store) as combined:
+        check_combined(combined, datasets)
+        assert np.isnan(combined['TMP_P0_L103_GLC0'][0, 0, 0])
+        assert combined['TMP_P0_L103_GLC0'].encoding['chunks'] == (3, 5, 7)
+
+
+def test_combine_netcdf_without_files(tmp_path):
+    with pytest.raises(ValueError):
+        tools.combine_netcdf([], tmp_path / 'combined.nc')
+
+
+def write_grib(grib_file, fields):
+    '''Write a GRIB2 file with one message per (discipline, category, number, level) field.'''
+    eccodes = pytest.importorskip('eccodes')
+    with open(grib_file, 'wb') as f:
+        for discipline, category, number, level in fields:
+            gid = eccodes.codes_grib_new_from_samples('GRIB2')
+            eccodes.codes_set(gid, 'discipline', discipline)
+            eccodes.codes_set(gid, 'parameterCategory', category)
+            eccodes.codes_set(gid, 'parameterNumber', number)
+            eccodes.codes_set(gid, 'typeOfFirstFixedSurface', 103)
+            eccodes.codes_set(gid, 'scaleFactorOfFirstFixedSurface', 0)
+            eccodes.codes_set(gid, 'scaledValueOfFirstFixedSurface', level)
+            eccodes.codes_write(gid, f)
+            eccodes.codes_release(gid)
+
+
+GRIB_FIELDS = [
+    (0, 0, 0, 2),
+    (0, 0, 6, 2),
+    (0, 2, 2, 10),
+    (0, 2, 3, 10),
+    (0, 2, 2, 80),
+    (0, 1, 1, 2),
+]
+
+
+@pytest.mark.parametrize('expected', [None, {'2t', '10u'}])
+def test_grib_list_vars_eccodes_matches_pygrib(tmp_path, monkeypatch, expected):
+    grib_file = tmp_path / 'test.grib2'
+    write_grib(grib_file, GRIB_FIELDS)
+
+    with_eccodes = tools._grib_list_vars(grib_file, expected=expected)
+
+    monkeypatch.setitem(sys.modules, 'eccodes', None)
+    with_pygrib = tools._grib_list_vars(grib_file, expected=expected)
+
+    assert with_eccodes == with_pygrib
+    assert list(with_eccodes) == list(with_pygrib)
+    assert with_eccodes['2t'] == '2 metre temperature'
+
+
+def test_bitround_zeroes_mantissa_bits():
+    values = np.array([273.15, -1.2345678, 1e-30, 3.4e38], dtype=np.float32)
+    rounded = _bitround(values, 10)
+    assert np.all(rounded.view(np.uint32) & np.uint32((1 << 13) - 1) == 0)
+    assert np.allclose(rounded, values, rtol=2**-10)
+
+
+def test_bitround_is_idempotent():
+    values = np.random.default_rng(0).normal(size=1000).astype(np.float32)
+    rounded = _bitround(values, 7)
+    assert np.array_equal(_bitround(rounded, 7), rounded)
+
+
+def test_bitround_keeps_nonfinite_values():
+    values = np.array([np.nan, np.inf, -np.inf], dtype=np.float32)
+    assert np.array_equal(_bitround(values, 5), values, equal_nan=True)
+
+
+@pytest.mark.parametrize('keepbits', [-1, 23, 30])
+def test_bitround_rejects_invalid_keepbits(keepbits):
+    with pytest.raises(ValueError):
+        _bitround(np.ones(3, dtype=np.float32), keepbits)
+
+
+@pytest.mark.parametrize('shape', [(10, 20), (1000, tools._PARALLEL_MIN_SIZE // 1000 + 1)])
+def test_hypot_matches_numpy(monkeypatch, shape):
+    # Computed in threads above _PARALLEL_MIN_SIZE values, even on a single CPU
+    monkeypatch.setattr(tools.os, 'cpu_count', lambda: 4)
+    rng = np.random.default_rng(0)
+    u = np.ma.masked_greater(rng.normal(0, 5, shape).astype(np.float32), 10)
+    v = np.ma.masked_less(rng.normal(0, 5, shape).astype(np.float32), -10)
+
+    result = tools._hypot(u, v)
+    expected = np.ma.hypot(u, v)
+
+    assert result.dtype == expected.dtype
+    np.testing.assert_array_equal(np.ma.getmaskarray(result), np.ma.getmaskarray(expected))
+    np.testing.assert_array_equal(result.compressed(), expected.compressed())
+
+
+class StubMessages(list):
+    '''GRIB messages of an open file, as returned by pygrib.open.'''
+
+    def seek(self, offset):
+        pass
+
+
+class StubMessage:
+    def __init__(self, **keys):
+        self.__dict__.update(keys)
+
+
+GRIB_SELECTORS = {
+    'TMP_P0_L103_GLC0': {'selector': {'shortName': '2t', 'level': 2}},
+    'U10': {'selector': {'shortName': '10u', 'level': 10}},
+}
+
+
+def test_select_grib_messages():
+    grbs = StubMessages(
+        [
+            StubMessage(shortName='2t', level=2),
+            StubMessage(shortName='2t', level=0),
+            StubMessage(shortName='10u', level=10),
+            StubMessage(level=2),
+        ]
+    )
+
+    messages = tools._select_grib_messages(grbs, GRIB_SELECTORS)
+
+    assert messages == {'TMP_P0_L103_GLC0': grbs[0], 'U10': grbs[2]}
+
+
+@pytest.mark.parametrize('n_messages', [0, 2])
+def test_select_grib_messages_requires_one_match(n_messages):
+    grbs = StubMessages(
+        [StubMessage(shortName='2t', level=2)] * n_messages
+        + [StubMessage(shortName='10u', level=10)]
+    )
+
+    with pytest.raises(ValueError, match=f"'TMP_P0_L103_GLC0', found {n_messages}"):
+        tools._select_grib_messages(grbs, GRIB_SELECTORS)
+
+
+def test_nc2nc_extract_vars_packs_and_rounds(tmp_path):
+    rng = np.random.default_rng(0)
+    shape = (6, 5)
+    ds = xr.Dataset(
+        {
+            name: (('ygrid_0', 'xgrid_0'), rng.uniform(0, 100, shape).astype(np.float32))
+            for name in ('RH', 'PACKED', 'T')
+        }
+    )
+    in_file = tmp_path / 'in.nc'
+    out_file = tmp_path / 'out.nc'
+    packing = {'dtype': 'int16', 'scale_factor': 0.1, 'add_offset': 0.0, '_FillValue': -32767}
+    ds.to_netcdf(in_file, encoding={'PACKED': packing, 'T': packing})
+
+    tools.nc2nc_extract_vars(
+        in_file, out_file, ['RH', 'PACKED', 'T'], scale_factors={'RH': 0.01}, keepbits={'T': 7}
+    )
+
+    with xr.open_dataset(in_file) as ds_in, xr.open_dataset(out_file) as ds_out:
+        # Packed as requested
+        assert ds_out['RH'].encoding['dtype'] == np.int16
+        assert ds_out['RH'].encoding['scale_factor'] == 0.01
+        assert np.abs(ds_out['RH'] - ds['RH']).max() <= 0.01 / 2 + 1e-6
+
+        # The packing of the input variable is kept
+        assert ds_out['PACKED'].encoding['dtype'] == np.int16
+        assert ds_out['PACKED'].encoding['scale_factor'] == 0.1
+        np.testing.assert_array_equal(ds_out['PACKED'], ds_in['PACKED'])
+
+        # Rounded variables are stored as float32 instead
+        assert ds_out['T'].encoding['dtype'] == np.float32
+        expected = _bitround(ds_in['T'].values.astype(np.float32), 7)
+        np.testing.assert_array_equal(ds_out['T'], expected)
+
+
+@pytest.mark.parametrize(
+    'contents, out_mtime, expected',
+    [
+        (None, None, False),  # missing
+        (b'', 2_000, False),  # empty
+        (b'nc', 500, False),  # older than the GRIB file
+        (b'nc', 1_000, True),  # as old as the GRIB file
+        (b'nc', 2_000, True),  # newer
+    ],
+)
+def test_is_up_to_date(tmp_path, contents, out_mtime, expected):
+    grib_file = tmp_path / 'file.grib2'
+    grib_file.write_bytes(b'grib')
+    os.utime(grib_file, (1_000, 1_000))
+
+    nc_file = tmp_path / 'file.nc'
+    if contents is not None:
+        nc_file.write_bytes(contents)
+        os.utime(nc_file, (out_mtime, out_mtime))
+
+    assert tools._is_up_to_date(nc_file, grib_file) is expected
+
+
+def test_is_up_to_date_without_input_file(tmp_path):
+    nc_file = tmp_path / 'file.nc'
+    nc_file.write_bytes(b'nc')
+
+    assert not tools._is_up_to_date(nc_file, tmp_path / 'file.grib2')